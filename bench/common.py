@@ -0,0 +1,122 @@
+# bench/common.py
+"""
+压测公共部分：按 DATABASE_URL 启动应用、计时、统计分位数、结果读写
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+DEFAULT_DB = "sqlite:////tmp/accounting_bench.db"
+
+
+def boot(db_url: str = None):
+    """
+    用指定数据库启动应用并推入 app_context，返回 (app, db)
+    DATABASE_URL 在 create_app 之前设置（config 模块导入时读取）
+    """
+    os.environ["DATABASE_URL"] = db_url or os.environ.get("DATABASE_URL") or DEFAULT_DB
+    os.environ.setdefault("APP_ENV", "development")
+
+    from wxcloudrun import create_app, db
+    from wxcloudrun.migrate import migrate
+
+    # 内部接口没配置令牌时一律 404，压测用一个本地令牌
+    app = create_app({"TESTING": True, "INTERNAL_TOKEN": os.environ.get("INTERNAL_TOKEN") or "bench"})
+    ctx = app.app_context()
+    ctx.push()
+    migrate()
+    return app, db
+
+
+def summarize(samples: list, wall: float = None) -> dict:
+    """
+    samples: 每次耗时（秒）=> 毫秒分位数 + 吞吐（次/秒，按实际总耗时）
+    """
+    if not samples:
+        return {"n": 0}
+    xs = sorted(samples)
+    n = len(xs)
+
+    def pct(p):
+        # 最近秩法
+        k = max(0, min(n - 1, math.ceil(p / 100.0 * n) - 1))
+        return round(xs[k] * 1000, 3)
+
+    total = wall if wall is not None else sum(xs)
+    return {
+        "n": n,
+        "min_ms": round(xs[0] * 1000, 3),
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": round(xs[-1] * 1000, 3),
+        "mean_ms": round(sum(xs) / n * 1000, 3),
+        "ops_per_s": round(n / total, 1) if total > 0 else None,
+    }
+
+
+def measure(fn, iterations: int, warmup: int = 5) -> dict:
+    """
+    顺序调用 fn(i) iterations 次（先预热 warmup 次，不计入）
+    """
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    t0 = time.perf_counter()
+    for i in range(iterations):
+        s = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - s)
+    return summarize(samples, time.perf_counter() - t0)
+
+
+def git_revision() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_meta(db, **extra) -> dict:
+    return dict({
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "db_dialect": db.engine.dialect.name,
+    }, **extra)
+
+
+def save(path: str, data: dict):
+    d = os.path.dirname(os.path.abspath(path))
+    os.makedirs(d, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(old: dict, new: dict, key: str = "p50_ms") -> list:
+    """
+    两次结果按 case 对比：[(name, old, new, 变化百分比), ...]，变化为正表示变慢
+    """
+    out = []
+    old_r = old.get("results", {})
+    for name, r in new.get("results", {}).items():
+        o = old_r.get(name, {}).get(key)
+        v = r.get(key)
+        if o is None or v is None:
+            continue
+        change = (v - o) / o * 100 if o else 0.0
+        out.append((name, o, v, round(change, 1)))
+    return out
@@ -0,0 +1,128 @@
+# bench/datagen.py
+"""
+合成账本数据：用户（含预置分类）/ 记录 / 凭证 / 预算，写入走 dao（汇总表同步维护）
+记录按幂律分给用户：少数重度用户记录很多，贴近真实分布
+
+    python -m bench.datagen --users 1000 --records 50000
+    python -m bench.datagen --db sqlite:////tmp/accounting_bench.db --users 50 --records 5000 --reset
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from bench.common import boot
+
+USER_PREFIX = "bench_"
+
+NOTES = ["午饭", "晚饭", "早餐 包子", "打车 回家", "地铁", "超市 买菜", "咖啡", "房租", "水电费", "话费",
+         "电影", "生日礼物", "工资", "奖金", "理财收益", "报销", "和同事吃午饭", "外卖", "加油", "买书"]
+
+
+def user_ids(n: int) -> list:
+    return [f"{USER_PREFIX}{i:05d}" for i in range(n)]
+
+
+def split_records(total: int, n_users: int, skew: float, rnd: random.Random) -> list:
+    """
+    total 条记录按幂律权重分给 n_users 个用户（第 0 个用户最多）
+    """
+    weights = [1.0 / (i + 1) ** skew for i in range(n_users)]
+    s = sum(weights)
+    counts = [int(total * w / s) for w in weights]
+    for _ in range(total - sum(counts)):
+        counts[rnd.randrange(n_users)] += 1
+    return counts
+
+
+def _items_for(rnd: random.Random, cats: dict, n: int, months: int, receipt_ratio: float, now: datetime):
+    span = int(months * 30.5 * 86400)
+    for _ in range(n):
+        type_ = "income" if rnd.random() < 0.15 else "expense"
+        cid, cname = rnd.choice(cats[type_])
+        occur_at = now - timedelta(seconds=rnd.randrange(span))
+        amount = int(rnd.lognormvariate(7.5, 1.0)) + 1
+        item = {
+            "type": type_,
+            "amount_cent": amount,
+            "category_id": cid,
+            "category_name_snapshot": cname,
+            "note": rnd.choice(NOTES) if rnd.random() < 0.7 else None,
+            "occur_at": occur_at.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        if rnd.random() < receipt_ratio:
+            item["receipts"] = [
+                {"file_id": f"cloud://bench/{rnd.getrandbits(64):016x}.jpg", "mime_type": "image/jpeg",
+                 "size_bytes": rnd.randrange(50_000, 2_000_000)}
+                for _ in range(rnd.randint(1, 3))
+            ]
+        yield item
+
+
+def generate(db, users: int, records: int, months: int = 24, receipt_ratio: float = 0.1,
+             skew: float = 0.8, seed: int = 42, batch: int = 500) -> dict:
+    from wxcloudrun.dao import add_budget, add_records_batch, get_or_create_user_by_openid
+    from wxcloudrun.model import Category
+
+    rnd = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    uids = user_ids(users)
+    counts = split_records(records, users, skew, rnd)
+
+    t0 = time.perf_counter()
+    inserted = 0
+    for uid, n in zip(uids, counts):
+        get_or_create_user_by_openid(uid, nick_name=uid)
+        cats = {"income": [], "expense": []}
+        for cid, type_, name in db.session.query(Category.id, Category.type, Category.name) \
+                .filter(Category.user_id == uid).all():
+            cats[type_].append((cid, name))
+
+        items = _items_for(rnd, cats, n, months, receipt_ratio, now)
+        while True:
+            chunk = [it for _, it in zip(range(batch), items)]
+            if not chunk:
+                break
+            inserted += sum(1 for r in add_records_batch(uid, chunk) if "id" in r)
+
+        try:
+            add_budget(uid, now.strftime("%Y-%m"), rnd.randrange(100_000, 1_000_000))
+        except ValueError:
+            db.session.rollback()  # 重复生成时预算已存在
+
+    return {
+        "users": users,
+        "records": inserted,
+        "heaviest_user_records": counts[0] if counts else 0,
+        "months": months,
+        "receipt_ratio": receipt_ratio,
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="生成压测用的合成账本数据")
+    ap.add_argument("--db", default=None, help="数据库 URL，默认 DATABASE_URL 或 sqlite:////tmp/accounting_bench.db")
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--records", type=int, default=50000, help="记录总数（按幂律分给各用户）")
+    ap.add_argument("--months", type=int, default=24, help="记录时间分布在最近多少个月")
+    ap.add_argument("--receipt-ratio", type=float, default=0.1, help="带凭证的记录比例")
+    ap.add_argument("--skew", type=float, default=0.8, help="幂律指数，越大越集中在少数用户")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--reset", action="store_true", help="先删掉全部表再生成")
+    args = ap.parse_args(argv)
+
+    app, db = boot(args.db)
+    if args.reset:
+        from wxcloudrun.migrate import migrate
+
+        db.drop_all()
+        migrate()
+
+    out = generate(db, args.users, args.records, months=args.months, receipt_ratio=args.receipt_ratio,
+                   skew=args.skew, seed=args.seed)
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+# bench/run.py
+"""
+基准测试：对 views.py 的每个接口（Flask test client，进程内，不含网络）和主要 dao 函数顺序计时，
+输出各 case 的分位数延迟和吞吐，保存为 JSON，可与上一次结果对比
+
+    python -m bench.datagen --users 1000 --records 50000 --reset   # 先造数据
+    python -m bench.run --iterations 200 --out bench/results/after.json --compare bench/results/before.json
+    python -m bench.run --only stats. --iterations 500             # 只跑名字包含 stats. 的 case
+
+读 case 使用记录最多的用户（重度用户），不改数据；写 case 主要使用中位数用户，跑完删除写入的记录、新建的分类和
+登录 case 新建的用户，并重建该用户的汇总，多次运行数据集保持不变（data_version 计数会增加）。
+POST /api/internal/purge-recycle 只跑 dry_run（同样的候选扫描和复核，但不删除），真正删除会改掉数据集。
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bench.common import boot, compare, load, measure, run_meta, save
+from bench.datagen import NOTES, USER_PREFIX
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class _FakeWxClient:
+    """
+    压测不访问微信：code 直接映射成 openid
+    """
+    def code2session(self, code: str) -> dict:
+        return {"openid": f"{USER_PREFIX}login_{code}"}
+
+
+class Bench:
+    def __init__(self, app, db, iterations: int, only: str = None):
+        from wxcloudrun.jwt_utils import create_token
+        from wxcloudrun.model import Category, Record, User
+
+        self.app = app
+        self.db = db
+        self.iterations = iterations
+        self.only = only
+        self.results = {}
+        self.client = app.test_client()
+
+        # 读用重度用户，写用中位数用户
+        from sqlalchemy import func
+        rows = db.session.query(Record.user_id, func.count(Record.id)).filter(
+            Record.user_id.like(USER_PREFIX + "%")
+        ).group_by(Record.user_id).order_by(func.count(Record.id).desc()).all()
+        if not rows:
+            raise SystemExit("没有压测数据，先运行 python -m bench.datagen")
+        self.heavy, self.heavy_count = rows[0]
+        self.writer = rows[len(rows) // 2][0]
+
+        self.h_read = {"Authorization": "Bearer " + create_token({"user_id": self.heavy, "login_type": "wx"})}
+        self.h_write = {"Authorization": "Bearer " + create_token({"user_id": self.writer, "login_type": "wx"})}
+
+        last = db.session.query(func.max(Record.occur_at)).filter(Record.user_id == self.heavy).scalar()
+        self.month = last.strftime("%Y-%m")
+        self.day = last.strftime("%Y-%m-%d")
+        self.year_from = (last - timedelta(days=365)).strftime("%Y-%m")
+        self.record_id = db.session.query(Record.id).filter(Record.user_id == self.heavy).order_by(Record.id.desc()).limit(1).scalar()
+        self.category_id = db.session.query(Category.id).filter(Category.user_id == self.heavy).limit(1).scalar()
+        self.w_category = db.session.query(Category.id).filter(
+            Category.user_id == self.writer, Category.type == "expense"
+        ).limit(1).scalar()
+        self.dataset = {
+            "users": db.session.query(func.count(User.id)).scalar(),
+            "records": db.session.query(func.count(Record.id)).scalar(),
+            "heavy_user_records": self.heavy_count,
+        }
+        db.session.remove()
+
+    # ---------------- 工具 ----------------
+
+    def case(self, name: str, fn, iterations: int = None, warmup: int = 5):
+        if self.only and self.only not in name:
+            return
+        n = iterations or self.iterations
+
+        def once(i):
+            fn(i)
+            self.db.session.remove()  # 和真实请求结束时一样归还连接、清空 session
+
+        r = measure(once, n, warmup=min(warmup, n))
+        self.results[name] = r
+        print(f"{name:<36} p50={r['p50_ms']:>9.3f}ms  p95={r['p95_ms']:>9.3f}ms  p99={r['p99_ms']:>9.3f}ms  "
+              f"{r['ops_per_s']:>8} ops/s")
+
+    def get(self, path, headers=None):
+        resp = self.client.get(path, headers=headers or self.h_read)
+        if resp.status_code not in (200, 304):
+            raise RuntimeError(f"GET {path} -> {resp.status_code}")
+        return resp
+
+    def send(self, method, path, headers=None, **kw):
+        resp = self.client.open(path, method=method, headers=headers or self.h_write, **kw)
+        data = resp.get_json(silent=True) or {}
+        if resp.status_code != 200 or data.get("code") != 0:
+            raise RuntimeError(f"{method} {path} -> {resp.status_code} {data}")
+        return data.get("data")
+
+    def _record_item(self, i):
+        return {
+            "type": "expense",
+            "amount_cent": 100 + i,
+            "category_id": self.w_category,
+            "occur_at": f"{self.day} 12:00:00",
+            "note": NOTES[i % len(NOTES)],
+        }
+
+    # ---------------- 接口 ----------------
+
+    def routes_read(self):
+        m, d = self.month, self.day
+        self.case("GET /api/categories", lambda i: self.get("/api/categories"))
+        self.case("GET /api/categories/<id>", lambda i: self.get(f"/api/categories/{self.category_id}"))
+        self.case("GET /api/records page", lambda i: self.get("/api/records?page=1&page_size=20"))
+        self.case("GET /api/records page=50", lambda i: self.get("/api/records?page=50&page_size=20"))
+        self.case("GET /api/records cursor", lambda i: self.get("/api/records?cursor=&page_size=20"))
+        deep = self.get("/api/records?cursor=&page_size=1000").get_json()["data"]["next_cursor"]
+        if deep:
+            self.case("GET /api/records cursor deep", lambda i: self.get(f"/api/records?cursor={deep}&page_size=20"))
+        self.case("GET /api/records month", lambda i: self.get(f"/api/records?cursor=&month={m}"))
+        self.case("GET /api/records day", lambda i: self.get(f"/api/records?cursor=&day={d}"))
+        self.case("GET /api/records with_total", lambda i: self.get("/api/records?cursor=&with_total=1"))
+        self.case("GET /api/records receipts", lambda i: self.get("/api/records?cursor=&include_receipts=1"))
+        etag = self.get("/api/records?cursor=").headers.get("ETag")
+        if etag:
+            h304 = dict(self.h_read, **{"If-None-Match": etag})
+            self.case("GET /api/records 304", lambda i: self.get("/api/records?cursor=", headers=h304))
+        self.case("GET /api/records/search", lambda i: self.get("/api/records/search?q=" + NOTES[i % len(NOTES)]))
+        self.case("GET /api/records/recycle", lambda i: self.get("/api/records/recycle?cursor="))
+        self.case("GET /api/records/<id>", lambda i: self.get(f"/api/records/{self.record_id}"))
+        self.case("GET /api/records/export csv month",
+                  lambda i: self.get(f"/api/records/export?format=csv&from={m}-01&to={d}").get_data())
+        self.case("GET /api/records/export ndjson all",
+                  lambda i: self.get("/api/records/export?format=ndjson").get_data(),
+                  iterations=max(3, self.iterations // 20), warmup=1)
+        self.case("GET /api/stats/calendar", lambda i: self.get(f"/api/stats/calendar?month={m}"))
+        self.case("GET /api/stats/month", lambda i: self.get(f"/api/stats/month?month={m}"))
+        self.case("GET /api/stats/day", lambda i: self.get(f"/api/stats/day?day={d}"))
+        self.case("GET /api/stats/categories", lambda i: self.get(f"/api/stats/categories?month={m}"))
+        self.case("GET /api/stats/series month",
+                  lambda i: self.get(f"/api/stats/series?from={self.year_from}&to={m}&granularity=month"))
+        self.case("GET /api/stats/series day",
+                  lambda i: self.get(f"/api/stats/series?from={m}&to={m}&granularity=day"))
+        self.case("GET /api/budgets", lambda i: self.get("/api/budgets"))
+        self.case("GET /api/whoami", lambda i: self.get("/api/whoami"))
+        internal = {"X-Internal-Token": self.app.config["INTERNAL_TOKEN"]}
+        self.case("GET /api/internal/pool", lambda i: self.get("/api/internal/pool", headers=internal))
+        self.case("GET /metrics", lambda i: self.get("/metrics", headers=internal).get_data())
+        self.case("POST /api/internal/purge-recycle dry_run", lambda i: self.send(
+            "POST", "/api/internal/purge-recycle", headers=internal, json={"dry_run": True}),
+                  iterations=max(3, self.iterations // 10), warmup=1)
+
+    def _cleanup_writes(self, max_ids: dict):
+        """
+        写 case 结束后删掉写入的记录、新建的分类和登录新建的用户，重建该用户的汇总，多次运行数据集保持不变
+        max_ids：写 case 之前各表的最大 id
+        """
+        from wxcloudrun.dao import rebuild_daily_stats
+        from wxcloudrun.model import Budget, Category, Receipt, Record, User
+
+        w = self.writer
+        Budget.query.filter(Budget.user_id == w, Budget.month >= "2100").delete(synchronize_session=False)
+        Receipt.query.filter(Receipt.user_id == w, Receipt.record_id > max_ids["records"]) \
+            .delete(synchronize_session=False)
+        Record.query.filter(Record.user_id == w, Record.id > max_ids["records"]).delete(synchronize_session=False)
+        new_users = [u for u, in self.db.session.query(User.user_id).filter(User.id > max_ids["users"])]
+        Category.query.filter(Category.id > max_ids["categories"],
+                              Category.user_id.in_(new_users + [w])).delete(synchronize_session=False)
+        User.query.filter(User.id > max_ids["users"]).delete(synchronize_session=False)
+        self.db.session.commit()
+        rebuild_daily_stats(w)
+        self.db.session.remove()
+
+    def routes_write(self):
+        from sqlalchemy import func
+        from wxcloudrun.model import Category, Record, User
+
+        q = self.db.session.query
+        max_ids = {
+            "records": q(func.max(Record.id)).scalar() or 0,
+            "categories": q(func.max(Category.id)).scalar() or 0,
+            "users": q(func.max(User.id)).scalar() or 0,
+        }
+        self.db.session.remove()
+        try:
+            self._routes_write()
+            self.dao_write()
+        finally:
+            self._cleanup_writes(max_ids)
+
+    def _routes_write(self):
+        ids = []
+
+        def create(i):
+            ids.append(self.send("POST", "/api/records", json=self._record_item(i))["id"])
+        self.case("POST /api/records", create)
+        self.case("PUT /api/records/<id>", lambda i: self.send(
+            "PUT", f"/api/records/{ids[i % len(ids)]}", json={"amount_cent": 200 + i, "note": "改"}))
+        # 预热也会调用，用队列保证每条记录只删除 / 恢复一次
+        alive, hidden = list(ids), []
+
+        def delete(i):
+            rid = alive.pop()
+            self.send("DELETE", f"/api/records/{rid}")
+            hidden.append(rid)
+
+        def restore(i):
+            rid = hidden.pop()
+            self.send("POST", f"/api/records/{rid}/restore")
+            alive.append(rid)
+        self.case("DELETE /api/records/<id>", delete)
+        self.case("POST /api/records/<id>/restore", restore)
+        for rid in alive:
+            self.send("DELETE", f"/api/records/{rid}")
+
+        batch = [self._record_item(k) for k in range(50)]
+        self.case("POST /api/records/batch x50", lambda i: self.send("POST", "/api/records/batch",
+                                                                     json={"records": batch}),
+                  iterations=max(3, self.iterations // 10), warmup=1)
+
+        csv_body = "日期,类型,金额,分类,备注\n" + "".join(
+            f"{self.day} 08:00:00,支出,{k + 1}.50,餐饮,{NOTES[k % len(NOTES)]}\n" for k in range(100))
+        self.case("POST /api/records/import x100", lambda i: self.send(
+            "POST", "/api/records/import", data=csv_body.encode("utf-8"), content_type="text/csv"),
+                  iterations=max(3, self.iterations // 10), warmup=1)
+
+        cids = []
+
+        def cat_create(i):
+            cids.append(self.send("POST", "/api/categories",
+                                  json={"type": "expense", "name": f"压测{time.time_ns() % 10**9}"})["id"])
+        self.case("POST /api/categories", cat_create)
+        self.case("PUT /api/categories/<id>", lambda i: self.send(
+            "PUT", f"/api/categories/{cids[i % len(cids)]}", json={"color": "#%06X" % i}))
+        self.case("DELETE /api/categories/<id>", lambda i: self.send("DELETE", f"/api/categories/{cids[i % len(cids)]}"))
+
+        bids = []
+
+        def budget_create(i):
+            month = f"{2100 + len(bids) // 12}-{len(bids) % 12 + 1:02d}"
+            bids.append(self.send("POST", "/api/budgets", json={"month": month, "amount_cent": 100000})["id"])
+        self.case("POST /api/budgets", budget_create)
+        self.case("PUT /api/budgets/<id>", lambda i: self.send(
+            "PUT", f"/api/budgets/{bids[i % len(bids)]}", json={"amount_cent": 100000 + i}))
+        self.case("GET /api/budgets/<id>", lambda i: self.send("GET", f"/api/budgets/{bids[i % len(bids)]}"))
+
+        def budget_delete(i):
+            if bids:
+                self.send("DELETE", f"/api/budgets/{bids.pop()}")
+        self.case("DELETE /api/budgets/<id>", budget_delete, iterations=min(self.iterations, len(bids)), warmup=0)
+
+        from wxcloudrun.wechat import get_client, set_client
+        real = get_client()
+        set_client(_FakeWxClient())
+        try:
+            self.case("POST /api/wxlogin", lambda i: self.send(
+                "POST", "/api/wxlogin", headers={}, json={"code": str(i % 50)}))
+        finally:
+            set_client(real)
+        self.case("POST /api/logout", lambda i: self.send("POST", "/api/logout"))
+
+        from wxcloudrun import dao
+
+        def add_delete(i):
+            r = dao.add_record(self.writer, "expense", 100, self.w_category, f"{self.day} 09:00:00", note="dao")
+            dao.delete_record(self.writer, r.id)
+        self.case("dao.add_record+delete_record", add_delete)
+
+    # ---------------- dao ----------------
+
+    def dao_read(self):
+        from wxcloudrun import dao
+
+        u, m, d = self.heavy, self.month, self.day
+        self.case("dao.list_category_dicts", lambda i: dao.list_category_dicts(u))
+        self.case("dao.list_records page=1", lambda i: dao.list_records(u, page=1))
+        self.case("dao.list_records_after", lambda i: dao.list_records_after(u, page_size=20))
+        self.case("dao.list_records_after month", lambda i: dao.list_records_after(u, month=m, page_size=20))
+        self.case("dao.list_records_after search",
+                  lambda i: dao.list_records_after(u, keyword=NOTES[i % len(NOTES)], page_size=20))
+        self.case("dao.attach_receipt_summary", lambda i: dao.attach_receipt_summary(
+            u, dao.list_records_after(u, page_size=20)[0]))
+        self.case("dao.calendar_summary", lambda i: dao.calendar_summary(u, m))
+        self.case("dao.month_summary", lambda i: dao.month_summary(u, m))
+        self.case("dao.day_summary", lambda i: dao.day_summary(u, d))
+        self.case("dao.series_summary month",
+                  lambda i: dao.series_summary(u, self.year_from, m, "month"))
+        self.case("dao.category_breakdown", lambda i: dao.category_breakdown(u, m))
+        self.case("dao.list_budgets", lambda i: dao.list_budgets(u))
+        self.case("dao.get_data_version", lambda i: dao.get_data_version(u))
+        self.case("dao.iter_export_chunks all", lambda i: sum(len(c) for c in dao.iter_export_chunks(u)),
+                  iterations=max(3, self.iterations // 20), warmup=1)
+
+    def dao_write(self):
+        """
+        会写库的 dao 函数（登录建档的 upsert、汇总重建会 bump data_version），随写 case 一起跑
+        """
+        from wxcloudrun import dao
+
+        self.case("dao.get_or_create_user_by_openid", lambda i: dao.get_or_create_user_by_openid(self.writer))
+        self.case("dao.rebuild_daily_stats heavy", lambda i: dao.rebuild_daily_stats(self.heavy),
+                  iterations=max(3, self.iterations // 20), warmup=1)
+
+
+def print_compare(old: dict, new: dict):
+    rows = compare(old, new)
+    if not rows:
+        return
+    print("\n对比 p50（正数表示变慢）：")
+    for name, o, v, change in sorted(rows, key=lambda x: -abs(x[3])):
+        print(f"{name:<36} {o:>9.3f}ms -> {v:>9.3f}ms  {change:+.1f}%")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="接口 / dao 基准测试")
+    ap.add_argument("--db", default=None, help="数据库 URL，默认 DATABASE_URL 或 sqlite:////tmp/accounting_bench.db")
+    ap.add_argument("--iterations", type=int, default=100)
+    ap.add_argument("--only", default=None, help="只跑名字包含该字符串的 case")
+    ap.add_argument("--skip-writes", action="store_true", help="不跑写接口和会写库的 dao 函数（只读压测，不改数据）")
+    ap.add_argument("--out", default=None, help="结果 JSON 路径，默认 bench/results/<时间>.json")
+    ap.add_argument("--compare", default=None, help="与之前的结果 JSON 对比")
+    args = ap.parse_args(argv)
+
+    app, db = boot(args.db)
+    b = Bench(app, db, args.iterations, only=args.only)
+    print(f"dataset: {b.dataset}  heavy user: {b.heavy}")
+
+    t0 = time.perf_counter()
+    b.routes_read()
+    b.dao_read()
+    if not args.skip_writes:
+        b.routes_write()
+
+    out = {
+        "meta": run_meta(db, iterations=args.iterations, dataset=b.dataset, argv=sys.argv[1:],
+                         seconds=round(time.perf_counter() - t0, 2)),
+        "results": b.results,
+    }
+    path = args.out or os.path.join(HERE, "results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    save(path, out)
+    print(f"\nsaved: {path}")
+
+    if args.compare:
+        print_compare(load(args.compare), out)
+
+
+if __name__ == "__main__":
+    main()
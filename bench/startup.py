@@ -0,0 +1,85 @@
+# bench/startup.py
+"""
+冷启动耗时检查：每次在全新的 Python 进程里计时 import wxcloudrun + create_app()，取中位数与预算比较，
+同时检查延迟导入的依赖（requests / jwt / pymysql）在启动阶段没有被加载。超预算或有违规时退出码为 1，可放进 CI。
+
+    python -m bench.startup                        # 默认生产配置（MySQL URL，不会真正连库）
+    python -m bench.startup --runs 9 --budget-ms 800
+    python -m bench.startup --db sqlite:////tmp/accounting_bench.db --warmup 2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动阶段不应加载的模块（只在登录 / 第一次连库时才用到）
+LAZY_MODULES = ("requests", "urllib3", "jwt", "pymysql")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import wxcloudrun
+t1 = time.perf_counter()
+app = wxcloudrun.create_app()
+t2 = time.perf_counter()
+loaded = [m for m in %r if m in sys.modules]
+warmed = wxcloudrun.warm_up(app, %d)
+t3 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "create_ms": (t2 - t1) * 1000,
+                  "warmup_ms": (t3 - t2) * 1000, "warmed": warmed, "loaded": loaded}))
+"""
+
+
+def probe(env: dict, warmup: int) -> dict:
+    out = subprocess.run([sys.executable, "-c", _PROBE % (LAZY_MODULES, warmup)], cwd=ROOT, env=env,
+                         capture_output=True, text=True, timeout=120)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip())
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="冷启动耗时预算检查")
+    ap.add_argument("--runs", type=int, default=7)
+    ap.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1000")),
+                    help="import + create_app 的中位数预算（毫秒），默认 STARTUP_BUDGET_MS 或 1000")
+    ap.add_argument("--db", default=None, help="数据库 URL（DATABASE_URL），默认用 config.py 的 MySQL 配置")
+    ap.add_argument("--warmup", type=int, default=0, help="顺带计时预热 n 个连接（需要数据库可连）")
+    args = ap.parse_args(argv)
+
+    env = dict(os.environ)
+    if args.db:
+        env["DATABASE_URL"] = args.db
+
+    probe(env, 0)  # 第一次运行会编译 .pyc，不计入
+    runs = [probe(env, args.warmup) for _ in range(args.runs)]
+    totals = [r["import_ms"] + r["create_ms"] for r in runs]
+    median = statistics.median(totals)
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+
+    print(f"import:     {statistics.median(r['import_ms'] for r in runs):8.1f} ms (median)")
+    print(f"create_app: {statistics.median(r['create_ms'] for r in runs):8.1f} ms (median)")
+    print(f"total:      {median:8.1f} ms (median of {len(runs)}, min {min(totals):.1f}, max {max(totals):.1f})"
+          f"  budget {args.budget_ms:.0f} ms")
+    if args.warmup:
+        print(f"warm-up:    {statistics.median(r['warmup_ms'] for r in runs):8.1f} ms "
+              f"({runs[-1]['warmed']} connection(s))")
+
+    ok = True
+    if median > args.budget_ms:
+        print(f"FAIL: startup {median:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+        ok = False
+    if loaded:
+        print(f"FAIL: modules loaded eagerly at startup: {', '.join(loaded)}")
+        ok = False
+    if ok:
+        print("OK")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
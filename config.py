@@ -1,14 +1,69 @@
 import os
 
-# 是否开启debug模式
-DEBUG = True
-
 def _env(key: str, default: str):
     """读取环境变量；如果为空字符串/全空白，则回退 default"""
     v = os.environ.get(key)
     return v if v and v.strip() else default
 
+# 运行环境：production（容器内，gunicorn）/ development（本地调试）
+APP_ENV = _env("APP_ENV", "development")
+
+# 是否开启debug模式：只在本地调试时开启
+DEBUG = APP_ENV != "production"
+
 # 读取数据库环境变量
 username = _env("MYSQL_USERNAME", "root")
 password = _env("MYSQL_PASSWORD", "123456mqY")
 db_address = _env("MYSQL_ADDRESS", "sh-cynosdbmysql-grp-azd78c1k.sql.tencentcdb.com:25608")
+# 只读实例地址（可选）：配置后列表/统计等只读查询走只读实例
+replica_address = _env("MYSQL_REPLICA_ADDRESS", "")
+# 完整数据库 URL（可选）：配置后覆盖上面的 MySQL 配置，压测/本地可用 sqlite:////tmp/bench.db
+DATABASE_URL = _env("DATABASE_URL", "")
+
+# 数据库连接池（每个 worker 进程一份）
+# 单个实例最多占用的 MySQL 连接数 = workers（WEB_CONCURRENCY，见 gunicorn.conf.py）* (DB_POOL_SIZE + DB_MAX_OVERFLOW)，
+# 配置了只读实例时两边各这么多；再乘以实例数，要小于数据库的 max_connections
+# - pool_pre_ping：取连接前先 ping，云数据库代理断掉的空闲连接不会让首个请求报错
+# - pool_recycle：比代理的空闲超时短，主动回收长时间未用的连接
+DB_POOL_SIZE = int(_env("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(_env("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(_env("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(_env("DB_POOL_RECYCLE", "280"))
+DB_POOL_PRE_PING = _env("DB_POOL_PRE_PING", "1") not in ("0", "false", "False")
+DB_CONNECT_TIMEOUT = int(_env("DB_CONNECT_TIMEOUT", "5"))
+DB_READ_TIMEOUT = int(_env("DB_READ_TIMEOUT", "30"))
+DB_WRITE_TIMEOUT = int(_env("DB_WRITE_TIMEOUT", "30"))
+# 启动预热：每个 worker 启动后先建好的连接数（不超过 DB_POOL_SIZE），0 表示不预热
+DB_WARMUP = int(_env("DB_WARMUP", "0"))
+
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+SQLALCHEMY_ENGINE_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+    "connect_args": {
+        "connect_timeout": DB_CONNECT_TIMEOUT,
+        "read_timeout": DB_READ_TIMEOUT,
+        "write_timeout": DB_WRITE_TIMEOUT,
+    },
+}
+
+# records 分区（flask records-partition）：预建到当前月/年之后多少个分区
+RECORDS_PARTITION_AHEAD = int(_env("RECORDS_PARTITION_AHEAD", "3"))
+
+# 回收站清理（flask purge-recycle / POST /api/internal/purge-recycle）
+# - RECYCLE_RETENTION_DAYS：删除（进回收站）超过多少天的记录被彻底删除
+# - PURGE_BATCH_SIZE：每批删除的记录数，批次越小锁持有越短
+# - PURGE_PAUSE_MS：批次之间至少暂停的时间（实际暂停不少于上一批的耗时，给只读实例追同步留时间）
+# - PURGE_MAX_SECONDS：接口触发时单次最多运行的秒数（要小于 GUNICORN_TIMEOUT），没删完下次继续
+RECYCLE_RETENTION_DAYS = int(_env("RECYCLE_RETENTION_DAYS", "30"))
+PURGE_BATCH_SIZE = int(_env("PURGE_BATCH_SIZE", "500"))
+PURGE_PAUSE_MS = int(_env("PURGE_PAUSE_MS", "200"))
+PURGE_MAX_SECONDS = int(_env("PURGE_MAX_SECONDS", "45"))
+
+# 内部运维接口（连接池状态、/metrics 等）的访问令牌，请求头 X-Internal-Token；
+# 为空时这些接口一律返回 404，除非显式设置 INTERNAL_ALLOW_NO_TOKEN=1（仅限本地调试，且不放开会改数据的接口）
+INTERNAL_TOKEN = _env("INTERNAL_TOKEN", "")
+INTERNAL_ALLOW_NO_TOKEN = _env("INTERNAL_ALLOW_NO_TOKEN", "0") in ("1", "true", "True")
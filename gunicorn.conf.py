@@ -0,0 +1,83 @@
+# gunicorn.conf.py
+# 生产环境启动配置（APP_ENV=production 时由 run.py 使用），参数均可用环境变量覆盖
+import math
+import os
+
+
+def _int_env(key, default):
+    v = os.environ.get(key)
+    return int(v) if v and v.strip() else default
+
+
+def _cgroup_cpus():
+    """
+    容器的 CPU 配额（核数，向上取整）；读不到或不限额时返回 None
+    cpu_count() 在容器里返回的是宿主机核数，不能用来定 worker 数
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:          # cgroup v2："<quota> <period>" 或 "max <period>"
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:   # cgroup v1
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return max(1, math.ceil(quota / period)) if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+# 监听地址由 run.py 通过 -b 传入，这里是兜底
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:80")
+
+# 多进程 + 每进程多线程：接口基本都是等数据库 / 微信接口的 IO，线程足够
+# 默认按容器 CPU 配额每核 2 个、最多 4 个；读不到配额时为 2
+# 每个 worker 有自己的连接池，单实例最多占用 workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) 个数据库连接（见 config.py）
+workers = _int_env("WEB_CONCURRENCY", min(2 * (_cgroup_cpus() or 1), 4))
+worker_class = "gthread"
+threads = _int_env("GUNICORN_THREADS", 4)
+
+# 主进程先加载应用再 fork，子进程共享代码页、启动更快
+preload_app = True
+
+# keep-alive 要比云托管网关的空闲超时（60s）长，避免网关复用到刚被关掉的连接
+keepalive = _int_env("GUNICORN_KEEPALIVE", 75)
+timeout = _int_env("GUNICORN_TIMEOUT", 60)
+# 收到 SIGTERM 后给进行中的请求留出的时间
+graceful_timeout = _int_env("GUNICORN_GRACEFUL_TIMEOUT", 30)
+
+# 定期重启 worker，兜底内存缓慢增长
+max_requests = _int_env("GUNICORN_MAX_REQUESTS", 5000)
+max_requests_jitter = _int_env("GUNICORN_MAX_REQUESTS_JITTER", 500)
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
+
+
+def when_ready(server):
+    # 主进程启动时检查一次搜索用的全文索引，缺失（如 records 已分区）时打 error 日志；结果随 fork 带给 worker
+    from wxcloudrun.dao import _fulltext_available
+
+    app = server.app.wsgi()
+    try:
+        with app.app_context():
+            _fulltext_available()
+    except Exception as e:
+        server.log.warning("search index check failed: %s", e)
+
+
+def post_fork(server, worker):
+    # preload 时主进程可能已经建立过数据库连接，子进程不能共用同一个 socket，丢掉重建
+    from wxcloudrun import db, warm_up
+
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose()
+    # DB_WARMUP > 0 时每个 worker 先建好连接，第一批请求不用等建连
+    warm_up(app)
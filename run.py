@@ -1,8 +1,24 @@
 # run.py
+import os
 import sys
-from wxcloudrun import app
+# FLASK_APP=run 时 flask 命令行会自动调用 create_app()
+from wxcloudrun import create_app
+
+
+def serve_production(host: str, port: int):
+    """
+    生产环境：用 gunicorn 多进程启动（配置见 gunicorn.conf.py）
+    exec 替换当前进程，SIGTERM 直接交给 gunicorn 主进程做优雅退出
+    """
+    conf = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+    os.execvp("gunicorn", ["gunicorn", "-c", conf, "-b", f"{host}:{port}", "wxcloudrun:create_app()"])
+
 
 if __name__ == '__main__':
     host = sys.argv[1] if len(sys.argv) > 1 else '0.0.0.0'
     port = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
-    app.run(host=host, port=port, debug=True)
+    # APP_ENV=production（Dockerfile 中设置）走 gunicorn，本地默认仍是 Flask 调试服务器
+    if os.environ.get("APP_ENV", "development") == "production":
+        serve_production(host, port)
+    else:
+        create_app().run(host=host, port=port, debug=True)
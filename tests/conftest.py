@@ -0,0 +1,46 @@
+# tests/conftest.py
+"""
+测试用 SQLite 临时库启动应用；DATABASE_URL 必须在 import config 之前设置
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_DB_FILE = os.path.join(tempfile.mkdtemp(prefix="accounting_test_"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_FILE}"
+os.environ.setdefault("APP_ENV", "development")
+
+
+@pytest.fixture(scope="session")
+def app():
+    from wxcloudrun import create_app
+    from wxcloudrun.migrate import migrate
+
+    app = create_app({"TESTING": True})
+    with app.app_context():
+        migrate()
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    """
+    新建一个带预置分类的用户，返回 (user_id, 请求头)
+    """
+    from wxcloudrun.dao import get_or_create_user_by_openid
+    from wxcloudrun.jwt_utils import create_token
+
+    user_id = f"test_{uuid.uuid4().hex[:12]}"
+    get_or_create_user_by_openid(user_id)
+    return user_id, {"Authorization": "Bearer " + create_token({"user_id": user_id})}
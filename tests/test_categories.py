@@ -0,0 +1,30 @@
+# tests/test_categories.py
+import json
+
+from wxcloudrun import db
+from wxcloudrun.dao import PRESET_CATEGORIES, get_data_version, get_or_create_user_by_openid, seed_default_categories
+from wxcloudrun.model import Category
+
+
+def test_seed_is_idempotent_and_does_not_bump(user):
+    user_id, _ = user
+    v = get_data_version(user_id)
+    get_or_create_user_by_openid(user_id)
+    seed_default_categories(user_id)
+    seed_default_categories(user_id, force=True)
+    assert get_data_version(user_id) == v
+    assert Category.query.filter_by(user_id=user_id).count() == len(PRESET_CATEGORIES)
+
+
+def test_get_with_all_hidden_does_not_write(client, user):
+    user_id, headers = user
+    for c in Category.query.filter_by(user_id=user_id):
+        r = client.put(f"/api/categories/{c.id}", headers=headers, json={"is_hidden": 1})
+        assert json.loads(r.data)["code"] == 0
+    db.session.expire_all()
+
+    v = get_data_version(user_id)
+    etags = {client.get("/api/categories", headers=headers).headers.get("ETag") for _ in range(3)}
+    assert get_data_version(user_id) == v
+    assert len(etags) == 1
+    assert Category.query.filter_by(user_id=user_id).count() == len(PRESET_CATEGORIES)
@@ -0,0 +1,40 @@
+# tests/test_etag.py
+import json
+
+from wxcloudrun.model import Category
+
+
+def test_if_none_match_returns_304_until_a_write(client, user):
+    user_id, h = user
+    cid = Category.query.filter_by(user_id=user_id, type="expense").first().id
+
+    for path in ("/api/categories", "/api/records?cursor=", "/api/budgets"):
+        r = client.get(path, headers=h)
+        etag = r.headers["ETag"]
+        assert r.status_code == 200 and etag.startswith('W/"')
+        assert r.headers["Cache-Control"] == "private, no-cache"
+
+        cond = dict(h, **{"If-None-Match": etag})
+        r304 = client.get(path, headers=cond)
+        assert r304.status_code == 304 and r304.headers["ETag"] == etag and not r304.data
+        # 多次读取不改变版本号
+        assert client.get(path, headers=h).headers["ETag"] == etag
+
+    # 另一个 URL 的 ETag 不同，不会互相命中
+    etag = client.get("/api/records?cursor=", headers=h).headers["ETag"]
+    assert client.get("/api/records?cursor=&page_size=5", headers=h).headers["ETag"] != etag
+
+    # 任何写入之后，旧 ETag 不再命中
+    r = client.post("/api/records", headers=h, json={
+        "type": "expense", "amount_cent": 100, "category_id": cid, "occur_at": "2024-05-01 10:00:00"})
+    assert json.loads(r.data)["code"] == 0
+    r = client.get("/api/records?cursor=", headers=dict(h, **{"If-None-Match": etag}))
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+    assert len(json.loads(r.data)["data"]["items"]) == 1
+
+
+def test_error_responses_have_no_etag(client, user):
+    _, h = user
+    r = client.get("/api/records?page_size=x", headers=h)
+    assert json.loads(r.data)["code"] == -1
+    assert "ETag" not in r.headers
@@ -0,0 +1,36 @@
+# tests/test_export.py
+import csv
+import io
+import json
+from datetime import datetime
+
+from wxcloudrun import db
+from wxcloudrun.model import Category, Record
+
+
+def _add(user_id, amount_cent, note):
+    cid = Category.query.filter_by(user_id=user_id, type="expense").first().id
+    # 接口不允许负数，老数据 / 直接导入的数据可能有（冲正、退款）
+    db.session.add(Record(user_id=user_id, type="expense", amount_cent=amount_cent, category_id=cid,
+                          note=note, occur_at=datetime(2024, 5, 1, 10, 0, 0)))
+    db.session.commit()
+
+
+def test_export_amount_formatting(client, user):
+    user_id, headers = user
+    for cent, note in ((-150, "neg"), (-5, "neg-small"), (0, "zero"), (12345, "pos")):
+        _add(user_id, cent, note)
+
+    r = client.get("/api/records/export?format=ndjson", headers=headers)
+    assert r.status_code == 200
+    amounts = {row["note"]: row["amount"] for row in map(json.loads, r.data.decode("utf-8").splitlines())}
+    assert amounts == {"neg": "-1.50", "neg-small": "-0.05", "zero": "0.00", "pos": "123.45"}
+
+
+def test_export_csv_negative_amount(client, user):
+    user_id, headers = user
+    _add(user_id, -150, "refund")
+
+    r = client.get("/api/records/export?format=csv", headers=headers)
+    rows = list(csv.DictReader(io.StringIO(r.data.decode("utf-8-sig"))))
+    assert [(x["amount_cent"], x["amount"]) for x in rows] == [("-150", "-1.50")]
@@ -0,0 +1,18 @@
+# tests/test_import.py
+import json
+
+
+def test_import_rejects_oversized_amount_per_row(client, user):
+    _, headers = user
+    csv_text = ("occur_at,type,amount_cent,category,note\n"
+                "2024-05-01 10:00:00,expense,150,餐饮,ok\n"
+                "2024-05-01 11:00:00,expense,99999999999,餐饮,too big\n"
+                "2024-05-02 10:00:00,income,-300,工资,ok2\n")
+    r = client.post("/api/records/import", headers=dict(headers, **{"Content-Type": "text/csv"}),
+                    data=csv_text.encode("utf-8"))
+    data = json.loads(r.data)
+    assert data["code"] == 0
+    out = data["data"]
+    assert out["inserted"] == 2 and out["skipped"] == 1
+    assert [e["line"] for e in out["errors"]] == [3]
+    assert "金额超出范围" in out["errors"][0]["error"]
@@ -0,0 +1,58 @@
+# tests/test_internal.py
+import json
+
+import pytest
+
+from wxcloudrun import db
+from wxcloudrun.dbpool import pool_status
+
+
+@pytest.fixture
+def internal_config(app):
+    saved = {k: app.config.get(k) for k in ("INTERNAL_TOKEN", "INTERNAL_ALLOW_NO_TOKEN")}
+    yield app.config
+    app.config.update(saved)
+
+
+def test_internal_closed_without_token(client, internal_config):
+    internal_config.update(INTERNAL_TOKEN="", INTERNAL_ALLOW_NO_TOKEN=False)
+    assert client.get("/api/internal/pool").status_code == 404
+    assert client.get("/metrics").status_code == 404
+    assert client.post("/api/internal/purge-recycle", json={"dry_run": True}).status_code == 404
+
+
+def test_internal_dev_opt_in(client, internal_config):
+    internal_config.update(INTERNAL_TOKEN="", INTERNAL_ALLOW_NO_TOKEN=True)
+    assert client.get("/api/internal/pool").status_code == 200
+    # 会改数据的接口不受开关影响
+    assert client.post("/api/internal/purge-recycle", json={"dry_run": True}).status_code == 404
+
+
+def test_internal_token_checked(client, internal_config):
+    internal_config.update(INTERNAL_TOKEN="s3cret", INTERNAL_ALLOW_NO_TOKEN=False)
+    assert client.get("/metrics", headers={"X-Internal-Token": "wrong"}).status_code == 403
+    assert client.get("/metrics", headers={"X-Internal-Token": "s3cret"}).status_code == 200
+    r = client.post("/api/internal/purge-recycle", json={"dry_run": True}, headers={"X-Internal-Token": "s3cret"})
+    assert r.status_code == 200
+
+
+def test_pool_stats_are_per_engine(app, client, internal_config, tmp_path):
+    internal_config.update(INTERNAL_TOKEN="s3cret")
+    app.config["SQLALCHEMY_BINDS"] = {"replica": f"sqlite:///{tmp_path / 'replica.db'}"}
+    try:
+        replica = db.get_engine(app, bind="replica")
+        before = pool_status(db.engine)["checkouts"]
+        for _ in range(3):
+            with db.engine.connect():
+                pass
+        assert pool_status(db.engine)["checkouts"] >= before + 3
+        assert pool_status(replica)["checkouts"] == 0
+
+        with replica.connect():
+            pass
+        replica.dispose()  # 新池沿用同一份累计值
+        data = json.loads(client.get("/api/internal/pool", headers={"X-Internal-Token": "s3cret"}).data)["data"]
+        assert data["replica"]["checkouts"] == 1 and data["replica"]["connects"] == 1
+        assert data["checkouts"] > data["replica"]["checkouts"]
+    finally:
+        app.config.pop("SQLALCHEMY_BINDS")
@@ -0,0 +1,24 @@
+# tests/test_metrics.py
+import time
+
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from wxcloudrun import db
+
+
+def test_failed_statement_does_not_skew_later_timings(app):
+    with app.test_request_context():
+        g._sql_count, g._sql_time = 0, 0.0
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            time.sleep(0.05)
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+            leftovers = {k: v for k, v in conn.info.items() if isinstance(v, list) and v}
+        assert g._sql_count == 3
+        assert g._sql_time < 0.05
+        assert not leftovers
@@ -0,0 +1,21 @@
+# tests/test_migrate.py
+from wxcloudrun import db
+from wxcloudrun.dao import get_or_create_user_by_openid
+from wxcloudrun.migrate import migrate
+from wxcloudrun.model import Category, User
+
+
+def test_backfill_keeps_renamed_presets(user):
+    user_id, _ = user
+    food = Category.query.filter_by(user_id=user_id, name="餐饮").one()
+    food.name = "吃饭"
+    # 模拟上线 categories_seeded 之前的老用户
+    User.query.filter_by(user_id=user_id).update({"categories_seeded": 0})
+    db.session.commit()
+
+    assert "users.categories_seeded: 1" in migrate()["backfilled"]
+    assert migrate()["backfilled"] == []
+
+    get_or_create_user_by_openid(user_id)
+    names = {c.name for c in Category.query.filter_by(user_id=user_id)}
+    assert "吃饭" in names and "餐饮" not in names
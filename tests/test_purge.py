@@ -0,0 +1,41 @@
+# tests/test_purge.py
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect
+
+from wxcloudrun import db
+from wxcloudrun.migrate import migrate
+from wxcloudrun.model import Category, Record
+from wxcloudrun.purge import purge_hidden_records
+
+
+def _add(user_id, hidden_at=None, updated_at=None, is_hidden=1):
+    cid = Category.query.filter_by(user_id=user_id, type="expense").first().id
+    r = Record(user_id=user_id, type="expense", amount_cent=100, category_id=cid, occur_at=datetime(2024, 5, 1),
+               is_hidden=is_hidden, hidden_at=hidden_at)
+    db.session.add(r)
+    db.session.flush()
+    if updated_at is not None:
+        db.session.execute(Record.__table__.update().where(Record.__table__.c.id == r.id)
+                           .values(updated_at=updated_at))
+    db.session.commit()
+    return r.id
+
+
+def test_purge_pages_by_hidden_at(user):
+    user_id, _ = user
+    assert "ix_records_hidden_at" in {ix["name"] for ix in inspect(db.engine).get_indexes("records")}
+
+    old = datetime.utcnow() - timedelta(days=60)
+    expired = [_add(user_id, hidden_at=old) for _ in range(3)]       # 同一 hidden_at，靠 id 翻页
+    expired.append(_add(user_id, hidden_at=old + timedelta(days=1)))
+    legacy = _add(user_id, hidden_at=None, updated_at=old)             # 上线 hidden_at 之前隐藏的
+    keep = [_add(user_id, hidden_at=datetime.utcnow()), _add(user_id, is_hidden=0)]
+
+    assert "records.hidden_at: 1" in migrate()["backfilled"]
+
+    out = purge_hidden_records(retention_days=30, batch_size=1, pause_ms=0)
+    assert out["done"] and out["records"] == 5 and out["batches"] == 5
+    left = {rid for rid, in db.session.query(Record.id).filter(Record.user_id == user_id)}
+    assert left == set(keep)
+    assert not left & set(expired + [legacy])
@@ -0,0 +1,21 @@
+# tests/test_records_batch.py
+import json
+
+from wxcloudrun.model import Category
+
+
+def test_batch_rejects_bad_items_individually(client, user):
+    user_id, headers = user
+    cid = Category.query.filter_by(user_id=user_id, type="expense").first().id
+    base = {"type": "expense", "amount_cent": 1, "category_id": cid, "occur_at": "2024-05-01 10:00:00"}
+    items = [
+        dict(base, note="x" * 201),
+        dict(base, amount_cent=2 ** 31),
+        dict(base, receipts=[{"file_id": "f1", "size_bytes": "abc"}]),
+        dict(base, receipts=[{"file_id": "f2", "size_bytes": -1}]),
+        dict(base, receipts=[{"file_id": "f3", "size_bytes": 2048}]),
+    ]
+    data = json.loads(client.post("/api/records/batch", headers=headers, json={"records": items}).data)
+    assert data["code"] == 0
+    assert ["error" in r for r in data["data"]["items"]] == [True, True, True, True, False]
+    assert (data["data"]["created"], data["data"]["failed"]) == (1, 4)
@@ -0,0 +1,40 @@
+# tests/test_records_list.py
+import json
+
+from wxcloudrun.model import Category
+
+
+def _post(client, headers, cid, n):
+    for i in range(n):
+        r = client.post("/api/records", headers=headers, json={
+            "type": "expense", "amount_cent": 100 + i, "category_id": cid,
+            "occur_at": f"2024-05-{i + 1:02d} 10:00:00", "note": f"n{i}",
+        })
+        assert json.loads(r.data)["code"] == 0
+
+
+def test_columns_layout_matches_objects(client, user):
+    user_id, headers = user
+    cid = Category.query.filter_by(user_id=user_id, type="expense").first().id
+    _post(client, headers, cid, 3)
+
+    objects = json.loads(client.get("/api/records?cursor=&include_receipts=1", headers=headers).data)["data"]
+    columns = json.loads(client.get("/api/records?cursor=&include_receipts=1&layout=columns",
+                                    headers=headers).data)["data"]
+
+    items = columns["items"]
+    assert set(items) == {"fields", "rows"}
+    assert [dict(zip(items["fields"], r)) for r in items["rows"]] == objects["items"]
+    assert objects["items"][0]["occur_at"] == "2024-05-03 10:00:00"
+
+
+def test_page_size_is_clamped(client, user):
+    user_id, headers = user
+    cid = Category.query.filter_by(user_id=user_id, type="expense").first().id
+    _post(client, headers, cid, 2)
+
+    for size, expect in (("0", 1), ("-3", 1), ("100000", 100)):
+        data = json.loads(client.get(f"/api/records?cursor=&page_size={size}", headers=headers).data)["data"]
+        assert data["page_size"] == expect
+        assert len(data["items"]) == min(expect, 2)
+    assert json.loads(client.get("/api/records?page_size=x", headers=headers).data)["code"] == -1
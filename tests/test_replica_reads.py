@@ -0,0 +1,39 @@
+# tests/test_replica_reads.py
+import os
+import shutil
+
+from flask import g
+
+from wxcloudrun import create_app, db
+from wxcloudrun.dao import _reads_for, add_category, get_data_version
+
+
+def _uses_replica(user_id) -> bool:
+    with _reads_for(user_id):
+        return bool(db.session().info.get("use_replica"))
+
+
+def test_reads_follow_replica_version(app, user, tmp_path):
+    user_id, _ = user
+    primary = app.config["SQLALCHEMY_DATABASE_URI"][len("sqlite:///"):]
+    replica = str(tmp_path / "replica.db")
+    shutil.copyfile(primary, replica)
+
+    app2 = create_app({"TESTING": True, "SQLALCHEMY_BINDS": {"replica": f"sqlite:///{replica}"}})
+    with app2.test_request_context():
+        # 只读实例和主库一致 => 走只读实例
+        assert _uses_replica(user_id)
+
+    with app2.test_request_context():
+        g.user_id = user_id
+        add_category(user_id, "expense", "副本测试")
+        # 只读实例还没同步这次写入 => 读主库；版本号也读主库
+        assert _uses_replica(user_id) is False
+        g.data_version = get_data_version(user_id)
+        assert _uses_replica(user_id) is False
+
+    shutil.copyfile(primary, replica)
+    with app2.test_request_context():
+        assert _uses_replica(user_id)
+    db.get_engine(app2, bind="replica").dispose()
+    os.remove(replica)
@@ -0,0 +1,85 @@
+# tests/test_rollups.py
+"""
+日 / 月汇总是记录增删改时增量维护的：任意一串写操作之后，必须和从 records 全量重建的结果一致
+"""
+import json
+
+from wxcloudrun import db
+from wxcloudrun.dao import rebuild_daily_stats
+from wxcloudrun.model import Budget, Category, DailyStat, MonthlyStat
+
+
+def _ok(resp):
+    data = json.loads(resp.data)
+    assert data["code"] == 0, data
+    return data["data"]
+
+
+def _rollups(user_id):
+    db.session.expire_all()
+    # 增量维护可能留下全 0 的行，重建不会生成，比较时忽略
+    daily = {(str(s.day), s.count, s.income_cent, s.expense_cent)
+             for s in DailyStat.query.filter_by(user_id=user_id) if s.count or s.income_cent or s.expense_cent}
+    monthly = {(s.month, s.count, s.income_cent, s.expense_cent)
+               for s in MonthlyStat.query.filter_by(user_id=user_id) if s.count or s.income_cent or s.expense_cent}
+    return daily, monthly
+
+
+def _alerted(user_id, month):
+    db.session.expire_all()
+    return Budget.query.filter_by(user_id=user_id, month=month).one().alerted
+
+
+def test_incremental_rollups_match_rebuild(client, user):
+    user_id, h = user
+    expense = Category.query.filter_by(user_id=user_id, type="expense").first().id
+    income = Category.query.filter_by(user_id=user_id, type="income").first().id
+
+    def add(type_, cent, cid, at):
+        return _ok(client.post("/api/records", headers=h, json={
+            "type": type_, "amount_cent": cent, "category_id": cid, "occur_at": at}))["id"]
+
+    _ok(client.post("/api/budgets", headers=h, json={"month": "2024-05", "amount_cent": 1000}))
+
+    a = add("expense", 600, expense, "2024-05-01 10:00:00")
+    b = add("income", 5000, income, "2024-05-02 10:00:00")
+    assert _alerted(user_id, "2024-05") == 0
+    c = add("expense", 500, expense, "2024-05-03 10:00:00")
+    assert _alerted(user_id, "2024-05") == 1            # 1100 >= 1000
+
+    # 改日期（跨月）、改金额、改类型
+    _ok(client.put(f"/api/records/{a}", headers=h, json={"amount_cent": 700, "occur_at": "2024-06-01 09:00:00"}))
+    assert _alerted(user_id, "2024-05") == 0            # 只剩 500
+    _ok(client.put(f"/api/records/{b}", headers=h, json={"type": "expense", "category_id": expense}))
+    assert _alerted(user_id, "2024-05") == 1
+
+    # 删除、重复删除（不能重复扣减）、恢复
+    _ok(client.delete(f"/api/records/{b}", headers=h))
+    assert json.loads(client.delete(f"/api/records/{b}", headers=h).data)["code"] == -1
+    assert _alerted(user_id, "2024-05") == 0
+    _ok(client.post(f"/api/records/{b}/restore", headers=h))
+    _ok(client.post(f"/api/records/{b}/restore", headers=h))
+    assert _alerted(user_id, "2024-05") == 1
+    _ok(client.delete(f"/api/records/{c}", headers=h))
+
+    # 批量、导入
+    _ok(client.post("/api/records/batch", headers=h, json={"records": [
+        {"type": "expense", "amount_cent": 30, "category_id": expense, "occur_at": "2024-05-01 12:00:00"},
+        {"type": "income", "amount_cent": 70, "category_id": income, "occur_at": "2024-07-01 12:00:00"},
+    ]}))
+    _ok(client.post("/api/records/import", headers=dict(h, **{"Content-Type": "text/csv"}), data=(
+        "occur_at,type,amount_cent,category,note\n"
+        "2024-05-04 10:00:00,expense,40,餐饮,\n"
+        "2024-06-02 10:00:00,income,90,工资,\n").encode("utf-8")))
+
+    # 分类改类型并同步记录：金额在汇总里从 expense 挪到 income
+    cid = _ok(client.post("/api/categories", headers=h, json={"type": "expense", "name": "会改类型"}))["id"]
+    add("expense", 80, cid, "2024-05-05 10:00:00")
+    add("expense", 20, cid, "2024-06-05 10:00:00")
+    _ok(client.put(f"/api/categories/{cid}", headers=h, json={"type": "income", "confirm_sync": 1}))
+
+    incremental = _rollups(user_id)
+    alerted = _alerted(user_id, "2024-05")
+    rebuild_daily_stats(user_id)
+    assert _rollups(user_id) == incremental
+    assert _alerted(user_id, "2024-05") == alerted
@@ -0,0 +1,22 @@
+# tests/test_startup.py
+"""
+冷启动预算：全新进程里 import wxcloudrun + create_app()（生产配置的 MySQL URL，不会真正连库）
+"""
+import os
+import statistics
+
+from bench.startup import probe
+
+BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1000"))
+
+
+def test_startup_budget_and_lazy_imports():
+    env = {k: v for k, v in os.environ.items() if k != "DATABASE_URL"}
+    env["APP_ENV"] = "production"
+    probe(env, 0)  # 第一次运行会编译 .pyc，不计入
+    runs = [probe(env, 0) for _ in range(3)]
+
+    total = statistics.median(r["import_ms"] + r["create_ms"] for r in runs)
+    assert total <= BUDGET_MS, f"startup {total:.1f} ms exceeds budget {BUDGET_MS:.0f} ms"
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    assert not loaded, f"modules loaded eagerly at startup: {', '.join(loaded)}"
@@ -1,32 +1,106 @@
+"""
+应用工厂：import 本包只建一个未绑定的 db，app / 路由 / 命令行都在 create_app() 里组装
+- 路由在 views.bp（Blueprint）里，不再依赖 run.py 里的 app
+- pymysql / requests / jwt 等用到时才导入，容器冷启动更快
+- warm_up(app) 可选地预先建好数据库连接（gunicorn 在每个 worker 启动后调用）
+"""
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-import pymysql
-import config
-import os
 
-pymysql.install_as_MySQLdb()
+import config
+# 支持读写分离的 SQLAlchemy（未配置只读实例时与原生一致）
+from wxcloudrun.routing import RoutingSQLAlchemy
 
-app = Flask(__name__, instance_relative_config=True)
-app.config['DEBUG'] = config.DEBUG
+db = RoutingSQLAlchemy()
 
 
 def _env(v, default):
     return v if v and str(v).strip() else default
 
 
-# 空值兜底（关键）
-username = _env(config.username, "root")
-password = _env(config.password, "123456mqY")
-db_address = _env(config.db_address, "sh-cynosdbmysql-grp-azd78c1k.sql.tencentcdb.com:25608")
+def _use_sqlite_bigint():
+    from sqlalchemy import BigInteger
+    from sqlalchemy.ext.compiler import compiles
+
+    # SQLite 只有 INTEGER PRIMARY KEY 才自增，BigInteger 主键按 INTEGER 建表
+    @compiles(BigInteger, "sqlite")
+    def _bigint_as_integer(type_, compiler, **kw):
+        return "INTEGER"
+
+
+def create_app(test_config: dict = None) -> Flask:
+    """
+    创建并配置应用；test_config 覆盖 config.py 里的配置（压测 / 脚本用）
+    """
+    app = Flask(__name__, instance_relative_config=True)
+    app.config['DEBUG'] = config.DEBUG
+    # 连接池等 SQLALCHEMY_* 配置需要在初始化 SQLAlchemy 之前加载
+    app.config.from_object('config')
+
+    # 空值兜底（关键）
+    username = _env(config.username, "root")
+    password = _env(config.password, "123456mqY")
+    db_address = _env(config.db_address, "sh-cynosdbmysql-grp-azd78c1k.sql.tencentcdb.com:25608")
+
+    # 明确使用 pymysql
+    app.config['SQLALCHEMY_DATABASE_URI'] = \
+        f'mysql+pymysql://{username}:{password}@{db_address}/accounting_mp?charset=utf8mb4'
+
+    # 只读实例（可选）
+    replica_address = _env(config.replica_address, "")
+
+    # DATABASE_URL 覆盖（压测 / 本地用 SQLite）：不用只读实例，去掉 PyMySQL 专用的连接参数
+    if config.DATABASE_URL:
+        app.config['SQLALCHEMY_DATABASE_URI'] = config.DATABASE_URL
+        replica_address = ""
+        if not config.DATABASE_URL.startswith("mysql"):
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+                k: v for k, v in app.config['SQLALCHEMY_ENGINE_OPTIONS'].items() if k != 'connect_args'
+            }
+    if replica_address:
+        app.config['SQLALCHEMY_BINDS'] = {
+            'replica': f'mysql+pymysql://{username}:{password}@{replica_address}/accounting_mp?charset=utf8mb4'
+        }
+    if test_config:
+        app.config.update(test_config)
+
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith("mysql://"):
+        # 未指定驱动的 mysql:// 让 pymysql 充当 MySQLdb；mysql+pymysql:// 建第一个连接时才会导入 pymysql
+        import pymysql
+        pymysql.install_as_MySQLdb()
+    elif uri.startswith("sqlite"):
+        _use_sqlite_bigint()
+
+    print(">>> DB ADDRESS:", db_address)
+    print(">>> DB URI:", uri.replace(password, "****"))
+    if replica_address:
+        print(">>> DB REPLICA ADDRESS:", replica_address)
+
+    # 连接池换成带等待时间统计的 QueuePool
+    from wxcloudrun.dbpool import TimedQueuePool
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'], poolclass=TimedQueuePool)
+    db.init_app(app)
 
-# 明确使用 pymysql
-app.config['SQLALCHEMY_DATABASE_URI'] = \
-    f'mysql+pymysql://{username}:{password}@{db_address}/accounting_mp?charset=utf8mb4'
+    # 请求耗时 / SQL 统计钩子（/metrics）
+    from wxcloudrun import commands, metrics, views
+    metrics.init_app(app)
+    app.register_blueprint(views.bp)
+    commands.init_app(app)
+    return app
 
-print(">>> DB ADDRESS:", db_address)
-print(">>> DB URI:", app.config['SQLALCHEMY_DATABASE_URI'].replace(password, "****"))
 
-db = SQLAlchemy(app)
+def warm_up(app, n: int = None) -> int:
+    """
+    预先建立 n 个数据库连接（默认 DB_WARMUP，主库和只读实例各 n 个），返回建立的连接总数
+    """
+    from wxcloudrun.dbpool import warm_up as warm_up_pool
+    from wxcloudrun.routing import REPLICA_BIND
 
-from wxcloudrun import views
-app.config.from_object('config')
+    n = app.config.get("DB_WARMUP", 0) if n is None else n
+    if n <= 0:
+        return 0
+    with app.app_context():
+        total = warm_up_pool(db.engine, n)
+        if REPLICA_BIND in (app.config.get("SQLALCHEMY_BINDS") or {}):
+            total += warm_up_pool(db.get_engine(app, bind=REPLICA_BIND), n)
+    return total
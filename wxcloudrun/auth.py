@@ -0,0 +1,85 @@
+# wxcloudrun/auth.py
+"""
+请求鉴权：从请求里取 token，校验后把当前用户放到 flask.g
+    @app.route(...)
+    @login_required
+    def xxx():
+        user_id = g.user_id
+"""
+import hmac
+from functools import wraps
+
+from flask import current_app, g, request
+
+from wxcloudrun.jwt_utils import decode_token_cached
+from wxcloudrun.response import make_err_response, make_json_response
+
+
+def get_token():
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        return auth[7:].strip()
+
+    t = request.headers.get("token")  # 兼容你 app.js 可能用 token 头
+    if t:
+        return t.strip()
+
+    t = request.args.get("token")
+    if t:
+        return t.strip()
+
+    return ""
+
+
+def current_user():
+    """
+    返回 (payload, err)：成功时 err 为 None
+    """
+    token = get_token()
+    if not token:
+        return None, "未登录：缺少token"
+    try:
+        payload = decode_token_cached(token)
+    except Exception:
+        return None, "token无效或已过期"
+    if not payload.get("user_id"):
+        return None, "token缺少user_id"
+    return payload, None
+
+
+def login_required(f):
+    """
+    校验失败直接返回错误响应；成功时设置 g.user_id / g.token_payload
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        payload, err = current_user()
+        if err:
+            return make_err_response(err)
+        g.token_payload = payload
+        g.user_id = payload["user_id"]
+        return f(*args, **kwargs)
+    return wrapper
+
+
+def internal_required(f=None, *, require_token: bool = False):
+    """
+    内部运维接口：要求请求头 X-Internal-Token 与 INTERNAL_TOKEN 一致，不一致返回 403
+    没配置 INTERNAL_TOKEN 时返回 404（不暴露接口存在）；
+    本地调试可设置 INTERNAL_ALLOW_NO_TOKEN 放开，require_token=True（会改数据的接口）不受其影响
+    """
+    if f is None:
+        return lambda fn: internal_required(fn, require_token=require_token)
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        cfg = current_app.config
+        expected = cfg.get("INTERNAL_TOKEN")
+        if not expected:
+            if require_token or not cfg.get("INTERNAL_ALLOW_NO_TOKEN"):
+                return make_json_response({"code": -1, "errorMsg": "接口不存在"}, status=404)
+            return f(*args, **kwargs)
+        if not hmac.compare_digest(request.headers.get("X-Internal-Token", ""), expected):
+            return make_json_response({"code": -1, "errorMsg": "无权访问"}, status=403)
+        return f(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,126 @@
+# wxcloudrun/cache.py
+"""
+简单的键值缓存：
+- 默认进程内（TTL + 容量上限，按 LRU 淘汰）
+- 配置了 REDIS_URL 时使用 Redis 作为多实例共享的后端（需要安装 redis 包）
+缓存值需要可以 JSON 序列化。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._data = OrderedDict()   # key -> (value, expire_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            value, expire_at = hit
+            if expire_at < now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: int):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class RedisBackend:
+    def __init__(self, url: str):
+        import redis  # 可选依赖，只有配置了 REDIS_URL 才需要
+
+        self._r = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+    def get(self, key):
+        raw = self._r.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl: int):
+        self._r.set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+
+    def delete(self, key):
+        self._r.delete(key)
+
+    def size(self) -> int:
+        return -1
+
+
+def _make_backend():
+    url = os.getenv("REDIS_URL", "").strip()
+    if url:
+        try:
+            return RedisBackend(url)
+        except Exception as e:
+            logger.warning("REDIS_URL 已配置但 Redis 不可用，回退到进程内缓存：%s", e)
+    return LocalBackend(int(os.getenv("CACHE_MAX_SIZE", "10000")))
+
+
+class Cache:
+    """
+    带命名空间和命中统计的缓存；后端异常时当作未命中，不影响主流程
+    """
+    def __init__(self, namespace: str, ttl: int, backend=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.backend = backend or _make_backend()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        try:
+            value = self.backend.get(self._key(key))
+        except Exception as e:
+            logger.warning("cache get failed: %s", e)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(self._key(key), value, self.ttl)
+        except Exception as e:
+            logger.warning("cache set failed: %s", e)
+
+    def delete(self, key):
+        try:
+            self.backend.delete(self._key(key))
+        except Exception as e:
+            logger.warning("cache delete failed: %s", e)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": self.backend.size()}
+
+
+# 用户分类列表：分类很少改动，但几乎每个页面都会读
+category_cache = Cache("categories", ttl=int(os.getenv("CATEGORY_CACHE_TTL", "300")))
@@ -0,0 +1,151 @@
+# wxcloudrun/commands.py
+"""
+命令行工具（flask CLI），用法：
+    FLASK_APP=run flask db-migrate
+"""
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+@click.command("db-migrate")
+@with_appcontext
+def db_migrate_command():
+    """补齐缺失的表、列和索引，回填老数据（幂等）"""
+    from wxcloudrun.migrate import migrate
+
+    out = migrate()
+    for name in out["tables"]:
+        click.echo(f"created table: {name}")
+    for name in out["columns"]:
+        click.echo(f"added column: {name}")
+    for name in out["indexes"]:
+        click.echo(f"created index: {name}")
+    for name in out["backfilled"]:
+        click.echo(f"backfilled: {name}")
+    if not any(out.values()):
+        click.echo("nothing to do")
+
+
+@click.command("rebuild-daily-stats")
+@with_appcontext
+@click.option("--user", "user_id", default=None, help="只重建指定用户（openid），默认全部用户")
+def rebuild_daily_stats_command(user_id):
+    """从 records 重建日/月汇总表（补数据/修复）"""
+    from wxcloudrun.dao import rebuild_daily_stats
+
+    n = rebuild_daily_stats(user_id=user_id)
+    click.echo(f"rebuilt daily stats for {n} user(s)")
+
+
+@click.command("import-records")
+@with_appcontext
+@click.option("--user", "user_id", required=True, help="导入到哪个用户（openid）")
+@click.option("--encoding", default="utf-8-sig", show_default=True)
+@click.option("--chunk-size", default=1000, show_default=True)
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_records_command(user_id, encoding, chunk_size, path):
+    """从 CSV 文件批量导入记录"""
+    from wxcloudrun.importer import import_records_csv
+
+    with open(path, "rb") as f:
+        out = import_records_csv(user_id, f, encoding=encoding, chunk_size=chunk_size)
+    click.echo(f"inserted: {out['inserted']}, skipped: {out['skipped']}, "
+               f"categories created: {out['categories_created']}")
+    for e in out["errors"]:
+        click.echo(f"  line {e['line']}: {e['error']}")
+
+
+def _run_partition_sql(stmts, dry_run):
+    from wxcloudrun.partition import execute
+
+    for sql in stmts:
+        click.echo(sql + ";")
+    if stmts and not dry_run:
+        execute(stmts)
+        click.echo("done")
+
+
+@click.command("records-partition")
+@click.option("--by", "granularity", type=click.Choice(["month", "year"]), default="month", show_default=True)
+@click.option("--since", default=None, help="第一个分区的月份 YYYY-MM，默认最早一条记录所在月（更早的都放进第一个分区）")
+@click.option("--ahead", type=int, default=None, help="预建到当前月/年之后几个分区，默认 RECORDS_PARTITION_AHEAD")
+@click.option("--dry-run", is_flag=True, help="只打印 SQL 不执行")
+@click.option("--accept-no-fulltext", is_flag=True, help="确认接受删除全文索引（之后记录搜索退化为 LIKE 扫描）")
+@with_appcontext
+def records_partition_command(granularity, since, ahead, dry_run, accept_no_fulltext):
+    """把 records 转成按 occur_at 的 RANGE 分区表（仅 MySQL，整表重建；转换后需重启应用进程）"""
+    from wxcloudrun.partition import partition_sql
+
+    ahead = current_app.config["RECORDS_PARTITION_AHEAD"] if ahead is None else ahead
+    try:
+        start = datetime.strptime(since, "%Y-%m").date() if since else None
+    except ValueError:
+        raise click.BadParameter("格式应为 YYYY-MM", param_hint="--since")
+    try:
+        stmts = partition_sql(granularity=granularity, ahead=ahead, since=start,
+                              accept_no_fulltext=accept_no_fulltext)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    _run_partition_sql(stmts, dry_run)
+
+
+@click.command("records-add-partitions")
+@click.option("--ahead", type=int, default=None, help="保证当前月/年之后至少有几个分区，默认 RECORDS_PARTITION_AHEAD")
+@click.option("--dry-run", is_flag=True, help="只打印 SQL 不执行")
+@with_appcontext
+def records_add_partitions_command(ahead, dry_run):
+    """预建 records 的未来分区（幂等，建议每天定时执行）"""
+    from wxcloudrun.partition import future_partitions_sql, partitions
+
+    ahead = current_app.config["RECORDS_PARTITION_AHEAD"] if ahead is None else ahead
+    try:
+        stmts = future_partitions_sql(ahead=ahead)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if not stmts:
+        click.echo("nothing to do")
+    _run_partition_sql(stmts, dry_run)
+    parts = partitions()
+    if parts:
+        named = [p for p in parts if p["less_than"] != "MAXVALUE"]
+        click.echo(f"{len(parts)} partition(s), last: {named[-1]['name'] if named else '-'}"
+                   f" (< {named[-1]['less_than'] if named else '-'})")
+
+
+@click.command("purge-recycle")
+@click.option("--days", "retention_days", type=int, default=None, help="保留天数，默认 RECYCLE_RETENTION_DAYS")
+@click.option("--batch-size", type=int, default=None, help="每批记录数，默认 PURGE_BATCH_SIZE")
+@click.option("--pause-ms", type=int, default=None, help="批次间最少暂停毫秒数，默认 PURGE_PAUSE_MS")
+@click.option("--max-seconds", type=float, default=None, help="最多运行的秒数，默认不限")
+@click.option("--files-out", type=click.Path(dir_okay=False, writable=True), default=None,
+              help="把被删凭证的 file_id 逐行写入该文件（用于清理云存储）")
+@click.option("--dry-run", is_flag=True, help="只统计，不删除")
+@with_appcontext
+def purge_recycle_command(retention_days, batch_size, pause_ms, max_seconds, files_out, dry_run):
+    """彻底删除回收站里超过保留期的记录及其凭证（分批、限速，可定时执行）"""
+    from wxcloudrun.purge import purge_hidden_records
+
+    f = open(files_out, "a", encoding="utf-8") if files_out else None
+    try:
+        out = purge_hidden_records(retention_days=retention_days, batch_size=batch_size, pause_ms=pause_ms,
+                                   max_seconds=max_seconds, dry_run=dry_run,
+                                   on_files=(lambda ids: f.write("".join(i + "\n" for i in ids))) if f else None)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        if f:
+            f.close()
+    click.echo(f"{'would purge' if dry_run else 'purged'} records: {out['records']}, receipts: {out['receipts']}, "
+               f"receipt bytes: {out['receipt_bytes']}, users: {out['users']} "
+               f"(hidden before {out['cutoff']} UTC, {out['batches']} batch(es), {out['seconds']}s)")
+    if not out["done"]:
+        click.echo("stopped at --max-seconds, run again to continue")
+
+
+def init_app(app):
+    for cmd in (db_migrate_command, rebuild_daily_stats_command, import_records_command,
+                records_partition_command, records_add_partitions_command, purge_recycle_command):
+        app.cli.add_command(cmd)
@@ -1,19 +1,96 @@
 # wxcloudrun/dao.py
+import base64
+import logging
+import re
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, g, has_request_context
 from wxcloudrun import db
-from wxcloudrun.model import User, Category, Record,Receipt
-from sqlalchemy import func, case
+from wxcloudrun.cache import category_cache
+from wxcloudrun.routing import REPLICA_BIND, primary_reads, replica_reads
+from wxcloudrun.model import User, Category, Record,Receipt, DailyStat, MonthlyStat, Budget
+from sqlalchemy import func, case, and_, inspect, or_, text
 
-def sync_record_receipts(user_id: str, record_id: int, receipts: list):
+logger = logging.getLogger(__name__)
+
+def _commit(user_id: str, bump: bool = True):
     """
-    receipts: [{file_id, mime_type?, size_bytes?}, ...]
-    规则：
-      - 以 file_id 为唯一标识
-      - DB 中不存在的 => 插入
-      - DB 中存在但不在本次 receipts 里 => 删除
+    提交写操作；bump=True 时在同一事务里把用户的 data_version +1
+    （读接口的 ETag 随之失效；读写分离时只读实例追上这个版本号之前，该用户的读走主库）
+    """
+    if bump:
+        _bump_data_version([user_id])
+    db.session.commit()
+    if has_request_context():
+        g.get("replica_caught_up", {}).pop(user_id, None)
+
+
+def _bump_data_version(user_ids):
+    users = User.__table__
+    db.session.execute(users.update().where(users.c.user_id.in_(user_ids)).values(
+        data_version=users.c.data_version + 1,
+        updated_at=users.c.updated_at,  # 不算资料更新，保持原值（否则 onupdate 会改掉）
+    ))
+
+
+def _replica_enabled() -> bool:
+    return REPLICA_BIND in (current_app.config.get("SQLALCHEMY_BINDS") or {})
+
+
+def _replica_caught_up(user_id: str) -> bool:
+    """
+    只读实例上该用户的 data_version 已追上主库 => 该用户的写入都已同步（版本号和数据在同一事务里提交）
+    比较的依据在数据库里，所有 worker / 实例看到的一致；同一请求内每个用户只比较一次
+    """
+    seen = g.setdefault("replica_caught_up", {}) if has_request_context() else {}
+    if user_id not in seen:
+        if g.get("user_id") == user_id and "data_version" in g:
+            primary = g.data_version  # versioned_etag 刚从主库读过
+        else:
+            primary = get_data_version(user_id)
+        with replica_reads(db.session):
+            v = db.session.query(User.data_version).filter(User.user_id == user_id).scalar()
+        seen[user_id] = v is not None and int(v) >= primary
+    return seen[user_id]
+
+
+def _reads_for(user_id: str):
+    """
+    该用户的只读查询上下文：配置了只读实例且只读实例已同步到该用户最新的写入 => 走只读实例
     """
-    # 1) 清洗输入：只保留有 file_id 的
-    cleaned = []
+    if _replica_enabled() and _replica_caught_up(user_id):
+        return replica_reads(db.session)
+    return nullcontext()
+
+
+def _read_only(f):
+    """
+    只读 DAO 函数（第一个参数为 user_id）：按 _reads_for 选择主库/只读实例
+    """
+    @wraps(f)
+    def wrapper(user_id, *args, **kwargs):
+        with _reads_for(user_id):
+            return f(user_id, *args, **kwargs)
+    return wrapper
+
+
+def get_data_version(user_id: str) -> int:
+    """
+    用户当前数据版本号（按唯一键点查一行），用户不存在时为 0
+    始终读主库：ETag / 缓存键 / 只读实例是否追上都以它为准，读到只读实例的旧版本会返回过期的 304
+    """
+    with primary_reads(db.session):
+        v = db.session.query(User.data_version).filter(User.user_id == user_id).scalar()
+    return int(v or 0)
+
+
+def _clean_receipts(receipts, user_id: str, record_id: int) -> list:
+    """
+    规整凭证输入：只保留有 file_id 的，同一 file_id 只取第一条
+    返回可直接 executemany 插入 receipts 表的行
+    """
+    rows = []
     seen = set()
     for it in receipts or []:
         if not isinstance(it, dict):
@@ -22,40 +99,49 @@ def sync_record_receipts(user_id: str, record_id: int, receipts: list):
         if not fid or fid in seen:
             continue
         seen.add(fid)
-        cleaned.append({
+        rows.append({
+            "record_id": record_id,
+            "user_id": user_id,
             "file_id": fid,
             "mime_type": it.get("mime_type"),
             "size_bytes": it.get("size_bytes"),
         })
+    return rows
+
+
+def _insert_receipts(rows: list):
+    # 一次 executemany（MySQL 下 PyMySQL 合并成一条多行 INSERT），不提交
+    if rows:
+        db.session.execute(Receipt.__table__.insert(), rows)
 
-    keep_ids = [x["file_id"] for x in cleaned]
 
-    # 2) 查当前 DB 已有的 receipts
-    existed = Receipt.query.filter_by(user_id=user_id, record_id=record_id).all()
-    existed_map = {r.file_id: r for r in existed}
-    existed_ids = set(existed_map.keys())
-    keep_set = set(keep_ids)
+def sync_record_receipts(user_id: str, record_id: int, receipts: list):
+    """
+    receipts: [{file_id, mime_type?, size_bytes?}, ...]
+    规则：
+      - 以 file_id 为唯一标识
+      - DB 中不存在的 => 插入
+      - DB 中存在但不在本次 receipts 里 => 删除
+    一次查询 + 至多一条 DELETE ... IN + 一次批量 INSERT
+    """
+    cleaned = _clean_receipts(receipts, user_id, record_id)
+    keep_set = {x["file_id"] for x in cleaned}
+
+    existed_ids = {fid for (fid,) in db.session.query(Receipt.file_id).filter(
+        Receipt.user_id == user_id, Receipt.record_id == record_id
+    ).all()}
 
-    # 3) 需要删除的：DB 有但本次没保留
+    # 需要删除的：DB 有但本次没保留
     del_ids = existed_ids - keep_set
     if del_ids:
         Receipt.query.filter_by(user_id=user_id, record_id=record_id) \
             .filter(Receipt.file_id.in_(list(del_ids))) \
             .delete(synchronize_session=False)
 
-    # 4) 需要新增的：本次有但 DB 没有
-    add_ids = keep_set - existed_ids
-    for x in cleaned:
-        if x["file_id"] in add_ids:
-            db.session.add(Receipt(
-                record_id=record_id,
-                user_id=user_id,
-                file_id=x["file_id"],
-                mime_type=x.get("mime_type"),
-                size_bytes=x.get("size_bytes"),
-            ))
+    # 需要新增的：本次有但 DB 没有
+    _insert_receipts([x for x in cleaned if x["file_id"] not in existed_ids])
 
-    db.session.commit()
+    _commit(user_id)
     
 def add_record_with_receipts(user_id: str, type: str, amount_cent: int, category_id: int,
                              occur_at: str, note=None, category_name_snapshot=None,
@@ -79,23 +165,171 @@ def add_record_with_receipts(user_id: str, type: str, amount_cent: int, category
     db.session.add(r)
     db.session.flush()  # ✅ 拿到 r.id，但不提交
 
-    recs = receipts or []
-    for it in recs:
-        file_id = (it.get("file_id") or "").strip()
-        if not file_id:
-            continue
-        db.session.add(Receipt(
-            record_id=r.id,
-            user_id=user_id,
-            file_id=file_id,
-            mime_type=it.get("mime_type"),
-            size_bytes=it.get("size_bytes"),
-        ))
+    _insert_receipts(_clean_receipts(receipts, user_id, r.id))
 
-    db.session.commit()
+    _apply_daily_deltas(_record_delta(r, +1))
+    _commit(user_id)
     return r
 
 
+BATCH_MAX_RECORDS = 500
+AMOUNT_CENT_MAX = 2 ** 31 - 1   # records.amount_cent 是 INT
+SIZE_BYTES_MAX = 2 ** 63 - 1    # receipts.size_bytes 是 BIGINT
+
+
+def _check_text(it: dict, key: str, column) -> str:
+    """
+    可选文本字段：超过列长度抛 ValueError（MySQL 严格模式下超长会让整批 INSERT 失败）
+    """
+    v = it.get(key)
+    if v is None:
+        return None
+    if not isinstance(v, str):
+        raise ValueError(f"{key} 必须是字符串")
+    if len(v) > column.type.length:
+        raise ValueError(f"{key} 最多 {column.type.length} 个字")
+    return v
+
+
+def _check_size(rc: dict):
+    """
+    凭证 size_bytes（可选）：非负整数且不超过 BIGINT，否则抛 ValueError
+    """
+    v = rc.get("size_bytes")
+    if v is None:
+        return
+    try:
+        n = int(v)
+    except (TypeError, ValueError):
+        raise ValueError("size_bytes 必须是整数")
+    if n < 0 or n > SIZE_BYTES_MAX:
+        raise ValueError("size_bytes 超出范围")
+
+
+def _clean_record_item(it, category_ids: set) -> tuple:
+    """
+    校验并规整一条待插入的记录，不合法抛 ValueError
+    返回：(record_row, receipts)；record_row 不含 user_id
+    """
+    if not isinstance(it, dict):
+        raise ValueError("记录必须是对象")
+    for k in ("type", "amount_cent", "category_id", "occur_at"):
+        if it.get(k) in (None, ""):
+            raise ValueError(f"缺少 {k}")
+
+    type_ = it["type"]
+    if type_ not in ("income", "expense"):
+        raise ValueError("type 只能是 income 或 expense")
+    try:
+        amount_cent = int(it["amount_cent"])
+        category_id = int(it["category_id"])
+    except (TypeError, ValueError):
+        raise ValueError("amount_cent / category_id 必须是整数")
+    if amount_cent < 0:
+        raise ValueError("amount_cent 不能为负数")
+    if amount_cent > AMOUNT_CENT_MAX:
+        raise ValueError("amount_cent 超出范围")
+    if category_id not in category_ids:
+        raise ValueError("分类不存在")
+    note = _check_text(it, "note", Record.note)
+    snapshot = _check_text(it, "category_name_snapshot", Record.category_name_snapshot)
+
+    receipts = it.get("receipts") or []
+    if not isinstance(receipts, list):
+        raise ValueError("receipts 必须是数组")
+    for rc in receipts:
+        if isinstance(rc, dict):
+            _check_text(rc, "file_id", Receipt.file_id)
+            _check_text(rc, "mime_type", Receipt.mime_type)
+            _check_size(rc)
+
+    row = {
+        "type": type_,
+        "amount_cent": amount_cent,
+        "category_id": category_id,
+        "category_name_snapshot": snapshot,
+        "note": note,
+        "occur_at": _parse_dt(str(it["occur_at"])),
+    }
+    return row, receipts
+
+
+_autoinc_step = None
+
+
+def _bulk_insert_records(rows: list) -> list:
+    """
+    批量插入 records，返回与 rows 顺序一致的 id 列表（不提交）
+    - MySQL：分块 executemany（PyMySQL 会合并成一条多行 INSERT），
+      同一条 INSERT 的自增 id 连续（步长 auto_increment_increment），由 lastrowid 推出全部 id
+    - 其它数据库（本地 SQLite 压测）：逐行插入
+    """
+    global _autoinc_step
+    table = Record.__table__
+    if not rows:
+        return []
+
+    if db.engine.dialect.name != "mysql":
+        return [db.session.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+
+    if _autoinc_step is None:
+        _autoinc_step = int(db.session.execute(text("SELECT @@auto_increment_increment")).scalar() or 1)
+
+    ids = []
+    chunk = 200  # 控制单条 INSERT 的长度，避免被 PyMySQL 再拆分导致 lastrowid 不是首行 id
+    for i in range(0, len(rows), chunk):
+        part = rows[i:i + chunk]
+        first = db.session.execute(table.insert(), part).lastrowid
+        ids.extend(first + k * _autoinc_step for k in range(len(part)))
+    return ids
+
+
+def add_records_batch(user_id: str, items: list) -> list:
+    """
+    批量记账：先逐条校验，合法的记录和凭证在一个事务里批量插入
+    返回：与 items 顺序一致的 [{"index", "id"} | {"index", "error"}, ...]
+    """
+    if len(items) > BATCH_MAX_RECORDS:
+        raise ValueError(f"单次最多 {BATCH_MAX_RECORDS} 条")
+
+    category_ids = {cid for (cid,) in db.session.query(Category.id).filter(Category.user_id == user_id).all()}
+
+    results = []
+    rows = []
+    receipts_of = []
+    for i, it in enumerate(items):
+        try:
+            row, receipts = _clean_record_item(it, category_ids)
+        except ValueError as e:
+            results.append({"index": i, "error": str(e)})
+            continue
+        row["user_id"] = user_id
+        rows.append(row)
+        receipts_of.append(receipts)
+        results.append({"index": i, "id": None})
+
+    if not rows:
+        return results
+
+    ids = _bulk_insert_records(rows)
+
+    receipt_rows = []
+    deltas = {}
+    for rid, row, receipts in zip(ids, rows, receipts_of):
+        _add_delta(deltas, (user_id, row["occur_at"].date()), 1, row["type"], row["amount_cent"])
+        receipt_rows.extend(_clean_receipts(receipts, user_id, rid))
+
+    _insert_receipts(receipt_rows)
+    _apply_daily_deltas(deltas)
+    _commit(user_id)
+
+    ok = iter(ids)
+    for res in results:
+        if "error" not in res:
+            res["id"] = next(ok)
+    return results
+
+
 def count_records_by_category(user_id: str, cid: int) -> int:
     return Record.query.filter_by(user_id=user_id, category_id=cid).count()
 
@@ -117,53 +351,93 @@ def sync_records_for_category(user_id: str, cid: int, new_name: str = None, new_
     if not update_fields:
         return 0
 
+    # 类型变更：受影响记录的金额要在日汇总里从旧类型挪到新类型
+    # 先锁住这些记录，汇总增量和随后的 UPDATE 看到的是同一批数据（并发的修改/删除等它提交）
+    if new_type is not None:
+        db.session.query(Record.id).filter(Record.user_id == user_id, Record.category_id == cid) \
+            .with_for_update().all()
+        day_col = func.date(Record.occur_at)
+        rows = db.session.query(
+            day_col.label("d"),
+            Record.type,
+            func.sum(Record.amount_cent).label("amount"),
+        ).filter(
+            Record.user_id == user_id,
+            Record.category_id == cid,
+            Record.is_hidden == 0,
+            Record.type != new_type,
+        ).group_by(day_col, Record.type).all()
+
+        deltas = {}
+        for row in rows:
+            key = (user_id, _as_date(row.d))
+            amount = int(row.amount or 0)
+            _add_delta(deltas, key, 0, row.type, -amount)
+            _add_delta(deltas, key, 0, new_type, amount)
+        _apply_daily_deltas(deltas)
+
     n = Record.query.filter_by(user_id=user_id, category_id=cid).update(
         update_fields, synchronize_session=False
     )
-    db.session.commit()
+    _commit(user_id)
     return int(n or 0)
 
-def get_record_by_id(user_id: str, rid: int, include_hidden: bool = False):
+def get_record_by_id(user_id: str, rid: int, include_hidden: bool = False, for_update: bool = False):
+    """
+    for_update=True：锁住记录行并重新读取（populate_existing，不用会话里的旧值），
+    按它算日/月汇总增量时，并发的修改/删除/恢复（连点两次删除之类）排队执行，不会重复扣减
+    """
     q = Record.query.filter_by(user_id=user_id, id=rid)
     if not include_hidden:
         q = q.filter_by(is_hidden=0)
+    if for_update:
+        q = q.populate_existing().with_for_update()
     return q.first()
 
 
 def update_record(user_id: str, rid: int, **fields):
-    r = get_record_by_id(user_id, rid)
+    r = get_record_by_id(user_id, rid, for_update=True)
     if not r:
         raise ValueError("记录不存在")
 
+    deltas = _record_delta(r, -1)
+
     allow = {"type", "amount_cent", "category_id", "note", "occur_at", "category_name_snapshot"}
     for k, v in fields.items():
         if k in allow and v is not None:
+            if k == "occur_at" and isinstance(v, str):
+                v = _parse_dt(v)
             setattr(r, k, v)
 
-    db.session.commit()
+    _apply_daily_deltas(_record_delta(r, +1, deltas))
+    _commit(user_id)
     return r
 
 def delete_record(user_id: str, rid: int):
-    r = get_record_by_id(user_id, rid)
+    r = get_record_by_id(user_id, rid, for_update=True)
     if not r:
         raise ValueError("记录不存在")
 
-    # ✅ 软删除：仅隐藏
+    # ✅ 软删除：仅隐藏（超过保留期后由 purge_hidden_records 彻底删除）
     r.is_hidden = 1
-    db.session.commit()
+    r.hidden_at = datetime.utcnow()
+    _apply_daily_deltas(_record_delta(r, -1))
+    _commit(user_id)
     return True
 
 def restore_record(user_id: str, rid: int):
     """
     恢复被隐藏(软删除)的记录：is_hidden=0
     """
-    r = Record.query.filter_by(user_id=user_id, id=rid).first()
+    r = get_record_by_id(user_id, rid, include_hidden=True, for_update=True)
     if not r:
         raise ValueError("记录不存在")
 
-    # 如果你后面把 get_record_by_id 默认过滤 is_hidden=0，这里要单独查全量，所以直接 query
-    r.is_hidden = 0
-    db.session.commit()
+    if int(r.is_hidden or 0) == 1:
+        r.is_hidden = 0
+        r.hidden_at = None
+        _apply_daily_deltas(_record_delta(r, +1))
+    _commit(user_id)
     return r
 
 
@@ -171,12 +445,7 @@ def add_category(user_id: str, type_: str, name: str, icon=None, color=None, sor
     """
     新增分类（同一用户下 user_id + type + name 唯一）
     """
-    name = (name or "").strip()
-    if not name:
-        raise ValueError("分类名称不能为空")
-
-    if type_ not in ("income", "expense"):
-        raise ValueError("type 只能是 income 或 expense")
+    name = _check_category_fields(type_, name)
 
     existed = Category.query.filter_by(user_id=user_id, type=type_, name=name).first()
     if existed:
@@ -193,9 +462,63 @@ def add_category(user_id: str, type_: str, name: str, icon=None, color=None, sor
         is_preset=0
     )
     db.session.add(c)
-    db.session.commit()
+    _commit(user_id)
     return c
 
+def _check_category_fields(type_: str, name: str) -> str:
+    """
+    分类字段校验，返回去掉首尾空白的名称
+    """
+    name = (name or "").strip()
+    if not name:
+        raise ValueError("分类名称不能为空")
+    if len(name) > 30:
+        raise ValueError("分类名称最多 30 个字")
+
+    if type_ not in ("income", "expense"):
+        raise ValueError("type 只能是 income 或 expense")
+    return name
+
+
+def category_id_map(user_id: str) -> dict:
+    """
+    用户全部分类（含隐藏）：{(type, name): id}
+    """
+    rows = db.session.query(Category.type, Category.name, Category.id).filter(Category.user_id == user_id).all()
+    return {(t, n): cid for t, n, cid in rows}
+
+
+def resolve_category(user_id: str, cmap: dict, type_: str, name: str) -> int:
+    """
+    按名称找分类 id，不存在则按 add_category 的规则新建（只 flush 不提交），并写回 cmap
+    """
+    name = _check_category_fields(type_, name)
+    cid = cmap.get((type_, name))
+    if cid is None:
+        c = Category(user_id=user_id, type=type_, name=name, sort=0, is_hidden=0, is_preset=0)
+        db.session.add(c)
+        db.session.flush()
+        cid = cmap[(type_, name)] = c.id
+    return cid
+
+
+def insert_records_chunk(user_id: str, rows: list) -> int:
+    """
+    一块不带凭证的记录：一次 executemany 插入 + 日汇总，一个事务提交
+    rows: [{type, amount_cent, category_id, category_name_snapshot, note, occur_at(datetime)}, ...]
+    """
+    if not rows:
+        return 0
+    deltas = {}
+    for row in rows:
+        row["user_id"] = user_id
+        _add_delta(deltas, (user_id, row["occur_at"].date()), 1, row["type"], row["amount_cent"])
+    db.session.execute(Record.__table__.insert(), rows)
+    _apply_daily_deltas(deltas)
+    _commit(user_id)
+    return len(rows)
+
+
 def get_category(user_id: str, cid: int) -> Category:
     c = Category.query.filter_by(id=cid, user_id=user_id).first()
     if not c:
@@ -224,7 +547,7 @@ def update_category(user_id, cid, type_=None, name=None, icon=None, color=None,
     if is_hidden is not None:
         c.is_hidden = int(is_hidden)
 
-    db.session.commit()
+    _commit(user_id)
     return c
 
 
@@ -235,90 +558,109 @@ def delete_category(user_id: str, cid: int):
         raise ValueError("预置分类不允许删除，可选择隐藏")
     # 软删除：改为隐藏，避免历史记录 category_id 失效
     c.is_hidden = 1
-    db.session.commit()
+    _commit(user_id)
 
 def get_or_create_user_by_openid(openid: str, nick_name=None, avatar_url=None) -> User:
-    u = User.query.filter_by(user_id=openid).first()
-    if u:
-        # 可选：更新昵称头像
-        changed = False
-        if nick_name and u.nick_name != nick_name:
-            u.nick_name = nick_name
-            changed = True
-        if avatar_url and u.avatar_url != avatar_url:
-            u.avatar_url = avatar_url
-            changed = True
-        if changed:
-            db.session.commit()
-
-        # ✅ 关键：老用户如果没有分类，也补一份默认分类
-        has_any = Category.query.filter_by(user_id=openid).first()
-        if not has_any:
-            seed_default_categories(openid)
+    """
+    登录建档：
+    1) upsert 用户（新用户插入；老用户只在传了昵称/头像时更新），并发首次登录也不会撞唯一键
+    2) 查出用户；已标记 categories_seeded 的直接返回（老用户登录只有这两条 SQL）
+    3) 未标记的补预置分类
+    """
+    now = datetime.utcnow()
+    sets = {}
+    if nick_name:
+        sets["nick_name"] = nick_name
+    if avatar_url:
+        sets["avatar_url"] = avatar_url
+    if sets:
+        sets["updated_at"] = now
+    _upsert(
+        User.__table__,
+        {"user_id": openid},
+        values={"nick_name": nick_name, "avatar_url": avatar_url, "created_at": now, "updated_at": now},
+        sets=sets,
+    )
+    _commit(openid, bump=False)
 
-        return u
+    u = User.query.filter_by(user_id=openid).first()
+    if not int(u.categories_seeded or 0):
+        seed_default_categories(openid)
+    return u
 
-    # 新用户创建
-    u = User(user_id=openid, nick_name=nick_name, avatar_url=avatar_url)
-    db.session.add(u)
-    db.session.commit()
 
-    # 新用户创建一份预置分类
-    seed_default_categories(openid)
-    return u
+# ✅ 预置分类：补上默认颜色（你可以按自己UI风格调整）
+PRESET_CATEGORIES = [
+    # expense
+    ("expense", "餐饮", "food",     "#FF8A00", 100),
+    ("expense", "交通", "traffic",  "#2D7CFF", 90),
+    ("expense", "购物", "shopping", "#FF4D4F", 80),
+    ("expense", "住房", "house",    "#8B5CF6", 70),
+    # income
+    ("income",  "工资", "salary",   "#34C759", 100),
+    ("income",  "奖金", "bonus",    "#10B981", 90),
+]
 
 
-def seed_default_categories(user_id: str):
-    # ✅ 预置分类：补上默认颜色（你可以按自己UI风格调整）
-    presets = [
-        # expense
-        ("expense", "餐饮", "food",     "#FF8A00", 100),
-        ("expense", "交通", "traffic",  "#2D7CFF", 90),
-        ("expense", "购物", "shopping", "#FF4D4F", 80),
-        ("expense", "住房", "house",    "#8B5CF6", 70),
-        # income
-        ("income",  "工资", "salary",   "#34C759", 100),
-        ("income",  "奖金", "bonus",    "#10B981", 90),
-    ]
+def seed_default_categories(user_id: str, force: bool = False):
+    """
+    补齐预置分类并标记用户 categories_seeded=1：
+    一次查出已有的同名分类，缺的一次批量插入
+    - 锁住用户行并重新读取（populate_existing，不用会话里缓存的旧值）：并发的首次登录排队执行，
+      后到的看到 categories_seeded=1 直接返回；已有分类用加锁读，读到最新提交的数据
+    - force=True（分类列表为空时的补救）：已标记过也检查一遍
+    - 没有任何改动时不提交（不 bump data_version，读接口的 ETag / 缓存不失效）
+    """
+    u = User.query.filter_by(user_id=user_id).populate_existing().with_for_update().first()
+    if u is None or (int(u.categories_seeded or 0) and not force):
+        db.session.rollback()
+        return
+
+    existed = {
+        (c.type, c.name): c
+        for c in Category.query.filter(
+            Category.user_id == user_id,
+            Category.name.in_([p[1] for p in PRESET_CATEGORIES])
+        ).populate_existing().with_for_update().all()
+    }
 
+    now = datetime.utcnow()
+    rows = []
     changed = False
-
-    for t, name, icon, color, sort in presets:
-        existed = Category.query.filter_by(user_id=user_id, type=t, name=name).first()
-
-        if existed:
-            # ✅ 老用户：如果预置分类颜色为空，补齐（不覆盖用户自己设置过的颜色）
-            if (not getattr(existed, "color", None)) and color:
-                existed.color = color
-                changed = True
-            # 可选：icon 为空也补一下
-            if (not getattr(existed, "icon", None)) and icon:
-                existed.icon = icon
-                changed = True
-            # sort 为 0 时补一下（不强制覆盖）
-            if (getattr(existed, "sort", 0) or 0) == 0 and sort:
-                existed.sort = sort
-                changed = True
+    for t, name, icon, color, sort in PRESET_CATEGORIES:
+        c = existed.get((t, name))
+        if c is None:
+            rows.append({
+                "user_id": user_id, "type": t, "name": name, "icon": icon, "color": color,
+                "is_hidden": 0, "sort": sort, "is_preset": 1, "created_at": now, "updated_at": now,
+            })
             continue
+        # ✅ 老用户：如果预置分类颜色为空，补齐（不覆盖用户自己设置过的颜色）
+        if (not getattr(c, "color", None)) and color:
+            c.color = color
+            changed = True
+        # 可选：icon 为空也补一下
+        if (not getattr(c, "icon", None)) and icon:
+            c.icon = icon
+            changed = True
+        # sort 为 0 时补一下（不强制覆盖）
+        if (getattr(c, "sort", 0) or 0) == 0 and sort:
+            c.sort = sort
+            changed = True
 
-        
-        db.session.add(Category(
-            user_id=user_id,
-            type=t,
-            name=name,
-            icon=icon,
-            color=color,     
-            is_hidden=0,
-            sort=sort,
-            is_preset=1
-        ))
+    if rows:
+        db.session.execute(Category.__table__.insert(), rows)
         changed = True
-
-    if changed:
-        db.session.commit()
-
+    if not int(u.categories_seeded or 0):
+        u.categories_seeded = 1
+    elif not changed:
+        db.session.rollback()
+        return
+    # 只改了标记时不 bump：不影响任何读接口的数据
+    _commit(user_id, bump=changed)
 
 
+@_read_only
 def list_categories(user_id: str, type_=None, include_hidden=False):
     q = Category.query.filter_by(user_id=user_id)
     if type_ in ("income", "expense"):
@@ -328,6 +670,38 @@ def list_categories(user_id: str, type_=None, include_hidden=False):
     return q.order_by(Category.sort.desc(), Category.id.desc()).all()
 
 
+def category_to_dict(c: Category) -> dict:
+    return {
+        "id": c.id,
+        "type": c.type,
+        "name": c.name,
+        "icon": c.icon,
+        "color": getattr(c, "color", None),
+        "is_hidden": c.is_hidden,
+        "sort": c.sort,
+        "is_preset": getattr(c, "is_preset", 0),
+    }
+
+
+def list_category_dicts(user_id: str, type_=None, version: int = None):
+    """
+    带缓存的可见分类列表（dict）：缓存该用户全部可见分类，按 type 过滤在内存里做
+    缓存键带用户数据版本号（version 不传时现查）：分类增删改都会让版本号 +1，
+    所有 worker 里的旧缓存随之失效（进程内缓存也不会跨进程读到旧列表）
+    """
+    if version is None:
+        version = get_data_version(user_id)
+    key = f"{user_id}:{version}"
+    items = category_cache.get(key)
+    if items is None:
+        # 按版本号缓存，必须读主库：只读实例可能还没同步到这个版本
+        items = [category_to_dict(c) for c in list_categories.__wrapped__(user_id, include_hidden=False)]
+        category_cache.set(key, items)
+    if type_ in ("income", "expense"):
+        items = [c for c in items if c["type"] == type_]
+    return items
+
+
 def add_record(user_id: str, type: str, amount_cent: int, category_id: int,
                occur_at: str, note=None, category_name_snapshot=None):
     # occur_at 支持 "YYYY-MM-DD HH:MM:SS" 或 ISO
@@ -343,22 +717,121 @@ def add_record(user_id: str, type: str, amount_cent: int, category_id: int,
         occur_at=dt,
     )
     db.session.add(r)
-    db.session.commit()
+    _apply_daily_deltas(_record_delta(r, +1))
+    _commit(user_id)
     return r
 
 
-from datetime import datetime, timedelta
+# 列表接口返回的字段（顺序与查询列一致）
+RECORD_LIST_FIELDS = ("id", "type", "amount_cent", "category_id", "category_name_snapshot",
+                      "category_color", "note", "occur_at")
+# include_receipts=1 时追加在每行末尾的字段
+RECORD_RECEIPT_FIELDS = ("receipt_count", "first_receipt_file_id")
 
-def list_records(user_id: str, month: str = None, day: str = None,
-                 page: int = 1, page_size: int = 20,
-                 only_hidden: bool = False):
+
+@_read_only
+def attach_receipt_summary(user_id: str, items: list) -> list:
     """
-    返回：items, total
-    items: [(Record, category_color), ...]
+    给一页记录追加凭证数和第一张凭证的 file_id（字段见 RECORD_RECEIPT_FIELDS）
+    整页一次 record_id IN (...) 查询，避免逐条查凭证
+    返回：[tuple, ...]，每行是原来的列 + (receipt_count, first_receipt_file_id)
+    """
+    summary = {}
+    ids = [r.id for r in items]
+    if ids:
+        rows = db.session.query(Receipt.record_id, Receipt.file_id).filter(
+            Receipt.user_id == user_id,
+            Receipt.record_id.in_(ids)
+        ).order_by(Receipt.record_id.asc(), Receipt.id.asc()).all()
+        for rid, fid in rows:
+            hit = summary.get(rid)
+            if hit is None:
+                summary[rid] = [1, fid]
+            else:
+                hit[0] += 1
+    return [tuple(r) + tuple(summary.get(r.id, (0, None))) for r in items]
+
+
+def list_receipts(user_id: str, record_id: int) -> list:
+    return Receipt.query.filter_by(user_id=user_id, record_id=record_id).order_by(Receipt.id.asc()).all()
+
+
+SEARCH_MAX_LEN = 50
+SEARCH_MAX_TERMS = 5
+# MySQL 布尔全文检索的运算符，用户输入里的这些字符当普通分隔符处理
+_FULLTEXT_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+
+
+_fulltext_cache = {}
+
+
+def _fulltext_available() -> bool:
+    """
+    主库上是否有 records 的全文索引（按进程缓存；分区转换后需重启进程）
+    MySQL 上没有时打 error 日志：搜索会退化为按用户扫描全部记录的 LIKE
+    （gunicorn 主进程启动时先检查一次，见 gunicorn.conf.py 的 when_ready）
+    """
+    engine = db.engine
+    if engine.dialect.name != "mysql":
+        return False
+    key = str(engine.url)
+    if key not in _fulltext_cache:
+        from wxcloudrun.partition import FULLTEXT_INDEX, TABLE, is_partitioned
+
+        names = {ix.get("name") for ix in inspect(engine).get_indexes(TABLE)}
+        _fulltext_cache[key] = FULLTEXT_INDEX in names
+        if not _fulltext_cache[key]:
+            logger.error("records 上没有全文索引 %s（%s），记录搜索退化为 LIKE 扫描，数据量大时会很慢",
+                         FULLTEXT_INDEX, "表已分区，分区表不支持全文索引" if is_partitioned(engine)
+                         else "执行 flask db-migrate 补建")
+    return _fulltext_cache[key]
+
+
+def _search_condition(q: str):
+    """
+    备注 / 分类名搜索条件，空格分隔的多个词之间是 AND：
+    - MySQL：MATCH ... AGAINST 布尔模式，走 ft_records_note_category 全文索引（ngram）
+      每个词按短语匹配；单个字（短于 ngram 的 2 字切分）用前缀匹配
+    - 其他数据库（本地 SQLite 等）、没有全文索引时（records 做了分区，见 partition.py）：LIKE 兜底
+    """
+    q = (q or "").strip()
+    if not q:
+        raise ValueError("搜索关键词不能为空")
+    if len(q) > SEARCH_MAX_LEN:
+        raise ValueError(f"搜索关键词最多 {SEARCH_MAX_LEN} 个字")
+
+    if _fulltext_available():
+        from sqlalchemy.dialects.mysql import match
+
+        terms = _FULLTEXT_OPERATORS.sub(" ", q).split()[:SEARCH_MAX_TERMS]
+        if not terms:
+            raise ValueError("搜索关键词不能为空")
+        against = " ".join(f'+"{t}"' if len(t) > 1 else f"+{t}*" for t in terms)
+        return match(Record.note, Record.category_name_snapshot, against=against).in_boolean_mode()
+
+    conds = []
+    for t in q.split()[:SEARCH_MAX_TERMS]:
+        pattern = "%" + t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conds.append(or_(Record.note.like(pattern, escape="\\"),
+                         Record.category_name_snapshot.like(pattern, escape="\\")))
+    return and_(*conds)
+
+
+def _record_list_query(user_id: str, month: str = None, day: str = None, only_hidden: bool = False,
+                       keyword: str = None):
+    """
+    列表公共查询：只取列表需要的列（含分类颜色），按 (occur_at, id) 倒序
+    keyword 不为空时按备注 / 分类名搜索
     """
     q = db.session.query(
-        Record,
-        Category.color.label("category_color")
+        Record.id,
+        Record.type,
+        Record.amount_cent,
+        Record.category_id,
+        Record.category_name_snapshot,
+        Category.color.label("category_color"),
+        Record.note,
+        Record.occur_at,
     ).outerjoin(
         Category,
         (Category.id == Record.category_id) & (Category.user_id == user_id)
@@ -373,76 +846,162 @@ def list_records(user_id: str, month: str = None, day: str = None,
         end = start.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
         q = q.filter(Record.occur_at >= start, Record.occur_at < end)
     elif month:
-        start = datetime.strptime(month + "-01", "%Y-%m-%d")
-        if start.month == 12:
-            end = datetime(start.year + 1, 1, 1)
-        else:
-            end = datetime(start.year, start.month + 1, 1)
+        start, end = _month_range(month)
         q = q.filter(Record.occur_at >= start, Record.occur_at < end)
 
-    q = q.order_by(Record.occur_at.desc(), Record.id.desc())
+    # ✅ 关键词搜索
+    if keyword:
+        q = q.filter(_search_condition(keyword))
+
+    return q.order_by(Record.occur_at.desc(), Record.id.desc())
+
+
+@_read_only
+def list_records(user_id: str, month: str = None, day: str = None,
+                 page: int = 1, page_size: int = 20,
+                 only_hidden: bool = False, keyword: str = None):
+    """
+    页码分页（兼容老版本前端）
+    返回：items, total
+    items: [Row, ...]，字段见 RECORD_LIST_FIELDS
+    """
+    q = _record_list_query(user_id, month=month, day=day, only_hidden=only_hidden, keyword=keyword)
 
     total = q.count()
     items = q.offset((page - 1) * page_size).limit(page_size).all()
     return items, total
 
 
-def calendar_summary(user_id: str, month: str):
+def encode_cursor(occur_at: datetime, rid: int) -> str:
+    raw = f"{occur_at.strftime('%Y-%m-%d %H:%M:%S.%f')}|{int(rid)}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        s = (cursor or "").strip()
+        raw = base64.urlsafe_b64decode(s + "=" * (-len(s) % 4)).decode("utf-8")
+        at, rid = raw.split("|", 1)
+        return datetime.strptime(at, "%Y-%m-%d %H:%M:%S.%f"), int(rid)
+    except Exception:
+        raise ValueError("cursor 无效")
+
+
+@_read_only
+def list_records_after(user_id: str, month: str = None, day: str = None,
+                       cursor: str = None, page_size: int = 20,
+                       only_hidden: bool = False, with_total: bool = False, keyword: str = None):
     """
-    返回当月每天的收入/支出汇总，用于日历标记
+    游标分页（keyset）：按 (occur_at, id) 倒序，从 cursor 之后继续取
+    - cursor 为空表示第一页
+    - 只有 with_total=True 才会执行 COUNT
+    - keyword 不为空时只返回备注 / 分类名匹配的记录
+    返回：items, next_cursor, total
+    items: [Row, ...]（字段见 RECORD_LIST_FIELDS）；next_cursor 为 None 表示没有更多；total 未请求时为 None
     """
-    from sqlalchemy import func, case
+    q = _record_list_query(user_id, month=month, day=day, only_hidden=only_hidden, keyword=keyword)
 
-    start = datetime.strptime(month + "-01", "%Y-%m-%d")
-    if start.month == 12:
-        end = datetime(start.year + 1, 1, 1)
-    else:
-        end = datetime(start.year, start.month + 1, 1)
+    total = q.order_by(None).count() if with_total else None
 
-    rows = db.session.query(
-        func.date(Record.occur_at).label("d"),
-        func.count(Record.id).label("cnt"),
-        func.sum(case((Record.type == "income", Record.amount_cent), else_=0)).label("income"),
-        func.sum(case((Record.type == "expense", Record.amount_cent), else_=0)).label("expense"),
-    ).filter(
-        Record.is_hidden == 0,
-        Record.user_id == user_id,
-        Record.occur_at >= start,
-        Record.occur_at < end
-    ).group_by(func.date(Record.occur_at)).all()
+    if cursor:
+        at, rid = decode_cursor(cursor)
+        # occur_at <= at 让索引走范围扫描，(occur_at, id) 严格小于游标
+        q = q.filter(
+            Record.occur_at <= at,
+            or_(Record.occur_at < at, Record.id < rid)
+        )
+
+    rows = q.limit(page_size + 1).all()
+    items = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = encode_cursor(last.occur_at, last.id)
+    return items, next_cursor, total
+
+
+def iter_export_chunks(user_id: str, start: datetime = None, end: datetime = None, chunk_size: int = 1000):
+    """
+    导出用：按 (occur_at, id) 正序分块读取用户全部未隐藏记录，每次 yield 一个块（list of Row）
+    - 每块用游标流式读取（stream_results + yield_per），读完立即归还连接，
+      客户端下载再慢也不会长时间占用数据库连接；内存只跟块大小有关
+    - 块之间用 keyset 续读，不用 OFFSET
+    """
+    last = None
+    while True:
+        q = db.session.query(
+            Record.id,
+            Record.occur_at,
+            Record.type,
+            Record.amount_cent,
+            Record.category_id,
+            Record.category_name_snapshot,
+            Category.color.label("category_color"),
+            Record.note,
+        ).outerjoin(
+            Category,
+            (Category.id == Record.category_id) & (Category.user_id == user_id)
+        ).filter(
+            Record.user_id == user_id,
+            Record.is_hidden == 0
+        )
+        if start is not None:
+            q = q.filter(Record.occur_at >= start)
+        if end is not None:
+            q = q.filter(Record.occur_at < end)
+        if last is not None:
+            at, rid = last
+            q = q.filter(Record.occur_at >= at, or_(Record.occur_at > at, Record.id > rid))
+
+        q = q.order_by(Record.occur_at.asc(), Record.id.asc()).limit(chunk_size)
+        with _reads_for(user_id):
+            rows = list(q.execution_options(stream_results=True).yield_per(200))
+        db.session.close()  # 归还连接，下一块重新取
+
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1].occur_at, rows[-1].id)
+
+
+@_read_only
+def calendar_summary(user_id: str, month: str):
+    """
+    返回当月每天的收入/支出汇总，用于日历标记（读日汇总表）
+    """
+    start, end = _month_range(month)
+
+    rows = DailyStat.query.filter(
+        DailyStat.user_id == user_id,
+        DailyStat.day >= start.date(),
+        DailyStat.day < end.date(),
+        DailyStat.count > 0
+    ).order_by(DailyStat.day.asc()).all()
 
     out = []
     for r in rows:
         out.append({
-            "day": r.d.strftime("%Y-%m-%d"),
-            "count": int(r.cnt or 0),
-            "income_cent": int(r.income or 0),
-            "expense_cent": int(r.expense or 0),
+            "day": r.day.strftime("%Y-%m-%d"),
+            "count": int(r.count or 0),
+            "income_cent": int(r.income_cent or 0),
+            "expense_cent": int(r.expense_cent or 0),
         })
     return {"month": month, "days": out}
 
+@_read_only
 def day_summary(user_id: str, day: str):
     """
     返回某天收入/支出汇总（单位：cent）
     """
-    start = datetime.strptime(day, "%Y-%m-%d")
-    start = start.replace(hour=0, minute=0, second=0, microsecond=0)
-    end = start + timedelta(days=1)
+    d = datetime.strptime(day, "%Y-%m-%d").date()
 
-    row = db.session.query(
-        func.count(Record.id).label("cnt"),
-        func.sum(case((Record.type == "income", Record.amount_cent), else_=0)).label("income"),
-        func.sum(case((Record.type == "expense", Record.amount_cent), else_=0)).label("expense"),
-    ).filter(
-        Record.is_hidden == 0,
-        Record.user_id == user_id,
-        Record.occur_at >= start,
-        Record.occur_at < end
-    ).first()
+    row = DailyStat.query.filter_by(user_id=user_id, day=d).first()
 
-    cnt = int(row.cnt or 0)
-    income = int(row.income or 0)
-    expense = int(row.expense or 0)
+    cnt = int(row.count or 0) if row else 0
+    income = int(row.income_cent or 0) if row else 0
+    expense = int(row.expense_cent or 0) if row else 0
     return {
         "day": day,
         "count": cnt,
@@ -451,28 +1010,477 @@ def day_summary(user_id: str, day: str):
         "net_cent": income - expense
     }
     
+@_read_only
 def month_summary(user_id: str, month: str):
-    # 返回当月收入/支出汇总（分）
-    from sqlalchemy import func, case
+    # 返回当月收入/支出汇总（分），直接读月汇总的一行
+    month = _check_month(month)
+
+    row = db.session.query(
+        MonthlyStat.income_cent, MonthlyStat.expense_cent
+    ).filter_by(user_id=user_id, month=month).first()
+
+    income = int(row.income_cent or 0) if row else 0
+    expense = int(row.expense_cent or 0) if row else 0
+    return {"month": month, "income_cent": income, "expense_cent": expense, "balance_cent": income - expense}
+
+
+# ---------------- 预算 ----------------
+
+def _month_spent(user_id: str, month: str) -> int:
+    v = db.session.query(MonthlyStat.expense_cent).filter_by(user_id=user_id, month=month).scalar()
+    return int(v or 0)
+
+
+def _evaluate_budget(user_id: str, month: str, budget: Budget = None):
+    """
+    按月汇总判断是否超支并同步 alerted（不提交）：两次唯一键点查，不扫描记录
+    超支 => alerted=1；支出回落到预算以内或关闭提醒 => alerted=0（再次超支会重新提醒）
+    """
+    if budget is None:
+        budget = Budget.query.filter_by(user_id=user_id, month=month).first()
+        if budget is None:
+            return None
+    over = _month_spent(user_id, month) >= budget.amount_cent
+    flag = 1 if (budget.alert_enabled and over) else 0
+    if budget.alerted != flag:
+        budget.alerted = flag
+    return budget
+
+
+def budget_to_dict(b: Budget, spent_cent: int) -> dict:
+    return {
+        "id": b.id,
+        "month": b.month,
+        "amount_cent": b.amount_cent,
+        "spent_cent": spent_cent,
+        "remaining_cent": b.amount_cent - spent_cent,
+        "over": spent_cent >= b.amount_cent,
+        "alert_enabled": b.alert_enabled,
+        "alerted": b.alerted,
+    }
+
+
+def _check_budget_amount(amount_cent) -> int:
+    try:
+        amount_cent = int(amount_cent)
+    except (TypeError, ValueError):
+        raise ValueError("amount_cent 必须是整数")
+    if amount_cent <= 0:
+        raise ValueError("预算金额必须大于 0")
+    return amount_cent
+
+
+@_read_only
+def list_budgets(user_id: str, month: str = None) -> list:
+    """
+    用户预算列表（按月份倒序），带当月已支出；一条左连月汇总的查询
+    """
+    q = db.session.query(Budget, MonthlyStat.expense_cent).outerjoin(
+        MonthlyStat,
+        (MonthlyStat.user_id == Budget.user_id) & (MonthlyStat.month == Budget.month)
+    ).filter(Budget.user_id == user_id)
+    if month:
+        q = q.filter(Budget.month == _check_month(month))
+    return [budget_to_dict(b, int(spent or 0)) for b, spent in q.order_by(Budget.month.desc()).all()]
+
+
+@_read_only
+def get_budget(user_id: str, bid: int) -> dict:
+    b = Budget.query.filter_by(id=bid, user_id=user_id).first()
+    if not b:
+        raise ValueError("预算不存在")
+    return budget_to_dict(b, _month_spent(user_id, b.month))
+
+
+def add_budget(user_id: str, month: str, amount_cent, alert_enabled: int = 1) -> Budget:
+    """
+    新增某月预算（同一用户每月一条）
+    """
+    month = _check_month(month)
+    amount_cent = _check_budget_amount(amount_cent)
+
+    if Budget.query.filter_by(user_id=user_id, month=month).first():
+        raise ValueError("该月预算已存在")
+
+    b = Budget(user_id=user_id, month=month, amount_cent=amount_cent,
+               alert_enabled=1 if alert_enabled else 0, alerted=0)
+    db.session.add(b)
+    _evaluate_budget(user_id, month, b)
+    _commit(user_id)
+    return b
+
+
+def update_budget(user_id: str, bid: int, amount_cent=None, alert_enabled=None) -> Budget:
+    b = Budget.query.filter_by(id=bid, user_id=user_id).first()
+    if not b:
+        raise ValueError("预算不存在")
+
+    if amount_cent is not None:
+        b.amount_cent = _check_budget_amount(amount_cent)
+    if alert_enabled is not None:
+        b.alert_enabled = 1 if alert_enabled else 0
+
+    _evaluate_budget(user_id, b.month, b)
+    _commit(user_id)
+    return b
+
+
+def delete_budget(user_id: str, bid: int):
+    b = Budget.query.filter_by(id=bid, user_id=user_id).first()
+    if not b:
+        raise ValueError("预算不存在")
+    db.session.delete(b)
+    _commit(user_id)
+
+
+@_read_only
+def category_breakdown(user_id: str, month: str, type_: str = "expense"):
+    """
+    当月按分类汇总（饼图/排行）：金额、笔数、占比，按金额倒序
+    一条 GROUP BY category_id，再左连分类取当前名称/颜色/图标；分类已删除时用记录里的名称快照
+    """
+    if type_ not in ("income", "expense"):
+        raise ValueError("type 只能是 income 或 expense")
+    start, end = _month_range(month)
+
+    agg = db.session.query(
+        Record.category_id.label("category_id"),
+        func.count(Record.id).label("cnt"),
+        func.sum(Record.amount_cent).label("amount"),
+        func.max(Record.category_name_snapshot).label("snapshot"),
+    ).filter(
+        Record.user_id == user_id,
+        Record.is_hidden == 0,
+        Record.occur_at >= start,
+        Record.occur_at < end,
+        Record.type == type_,
+    ).group_by(Record.category_id).subquery()
+
+    rows = db.session.query(
+        agg.c.category_id, agg.c.cnt, agg.c.amount, agg.c.snapshot,
+        Category.name, Category.color, Category.icon,
+    ).outerjoin(
+        Category,
+        (Category.id == agg.c.category_id) & (Category.user_id == user_id)
+    ).order_by(agg.c.amount.desc(), agg.c.category_id.asc()).all()
+
+    total = sum(int(r.amount or 0) for r in rows)
+    items = []
+    for cid, cnt, amount, snapshot, name, color, icon in rows:
+        amount = int(amount or 0)
+        items.append({
+            "category_id": cid,
+            "name": name or snapshot or "",
+            "color": color,
+            "icon": icon,
+            "count": int(cnt or 0),
+            "amount_cent": amount,
+            "share": round(amount / total, 4) if total else 0,
+        })
+    return {"month": month, "type": type_, "total_cent": total, "categories": items}
+
+
+SERIES_GRANULARITIES = ("day", "week", "month", "year")
+SERIES_MAX_DAYS = 3660   # 最多约 10 年
+SERIES_MAX_DAY_BUCKETS = 400
+
+
+def _parse_series_bound(v: str, is_end: bool):
+    """
+    "YYYY-MM-DD" / "YYYY-MM" / "YYYY" => date；只给到月/年时，结束日期取该月/年的最后一天
+    """
+    v = (v or "").strip()
+    try:
+        if len(v) == 10:
+            return datetime.strptime(v, "%Y-%m-%d").date()
+        if len(v) == 7:
+            start, end = _month_range(v)
+            return (end - timedelta(days=1)).date() if is_end else start.date()
+        if len(v) == 4:
+            y = int(v)
+            return datetime(y, 12, 31).date() if is_end else datetime(y, 1, 1).date()
+    except ValueError:
+        pass
+    raise ValueError("日期格式错误，应为 YYYY-MM-DD / YYYY-MM / YYYY")
+
+
+def _series_bucket(d, granularity: str):
+    """
+    日期 => 所在区间的起始日期（周从周一开始）
+    """
+    if granularity == "week":
+        return d - timedelta(days=d.weekday())
+    if granularity == "month":
+        return d.replace(day=1)
+    if granularity == "year":
+        return d.replace(month=1, day=1)
+    return d
+
+
+def _next_bucket(d, granularity: str):
+    if granularity == "day":
+        return d + timedelta(days=1)
+    if granularity == "week":
+        return d + timedelta(days=7)
+    if granularity == "month":
+        return d.replace(year=d.year + 1, month=1) if d.month == 12 else d.replace(month=d.month + 1)
+    return d.replace(year=d.year + 1)
+
+
+def _series_key(d, granularity: str) -> str:
+    if granularity == "month":
+        return d.strftime("%Y-%m")
+    if granularity == "year":
+        return d.strftime("%Y")
+    return d.strftime("%Y-%m-%d")
+
+
+@_read_only
+def series_summary(user_id: str, from_: str, to: str, granularity: str = "day"):
+    """
+    [from, to] 区间内按 日/周/月/年 分组的收入/支出序列（分），空区间补 0
+    一次读出区间内的日汇总行，再在内存里归并（行数 <= 区间天数）
+    """
+    granularity = (granularity or "day").strip()
+    if granularity not in SERIES_GRANULARITIES:
+        raise ValueError("granularity 只能是 day/week/month/year")
+
+    start = _parse_series_bound(from_, is_end=False)
+    end = _parse_series_bound(to, is_end=True)
+    if start > end:
+        raise ValueError("from 不能晚于 to")
+    days = (end - start).days + 1
+    if days > SERIES_MAX_DAYS:
+        raise ValueError(f"时间跨度不能超过 {SERIES_MAX_DAYS} 天")
+    if granularity == "day" and days > SERIES_MAX_DAY_BUCKETS:
+        raise ValueError(f"按天统计时跨度不能超过 {SERIES_MAX_DAY_BUCKETS} 天")
+
+    rows = db.session.query(
+        DailyStat.day, DailyStat.count, DailyStat.income_cent, DailyStat.expense_cent
+    ).filter(
+        DailyStat.user_id == user_id,
+        DailyStat.day >= start,
+        DailyStat.day <= end,
+        DailyStat.count > 0
+    ).all()
+
+    # 先按区间建好全部（含空）桶，保证顺序且补 0
+    buckets = {}
+    b = _series_bucket(start, granularity)
+    while b <= end:
+        buckets[b] = [0, 0, 0]
+        b = _next_bucket(b, granularity)
+
+    for day, cnt, income, expense in rows:
+        acc = buckets[_series_bucket(_as_date(day), granularity)]
+        acc[0] += int(cnt or 0)
+        acc[1] += int(income or 0)
+        acc[2] += int(expense or 0)
+
+    series = []
+    total = [0, 0, 0]
+    for b, (cnt, income, expense) in buckets.items():
+        series.append({
+            "key": _series_key(b, granularity),
+            "start": max(b, start).strftime("%Y-%m-%d"),
+            "end": min(_next_bucket(b, granularity) - timedelta(days=1), end).strftime("%Y-%m-%d"),
+            "count": cnt,
+            "income_cent": income,
+            "expense_cent": expense,
+            "net_cent": income - expense,
+        })
+        total[0] += cnt
+        total[1] += income
+        total[2] += expense
+
+    return {
+        "from": start.strftime("%Y-%m-%d"),
+        "to": end.strftime("%Y-%m-%d"),
+        "granularity": granularity,
+        "series": series,
+        "total": {
+            "count": total[0],
+            "income_cent": total[1],
+            "expense_cent": total[2],
+            "net_cent": total[1] - total[2],
+        },
+    }
+
+
+def rebuild_daily_stats(user_id: str = None) -> int:
+    """
+    从 records 重新计算日汇总（补数据/修复用）
+    - 指定 user_id 只重建该用户；否则逐个用户重建，每个用户一个事务
+    返回：重建的用户数
+    """
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [u for (u,) in db.session.query(User.user_id).order_by(User.id.asc()).all()]
+
+    day_col = func.date(Record.occur_at)
+    for uid in user_ids:
+        DailyStat.query.filter_by(user_id=uid).delete(synchronize_session=False)
+        src = db.session.query(
+            Record.user_id,
+            day_col,
+            func.count(Record.id),
+            func.sum(case((Record.type == "income", Record.amount_cent), else_=0)),
+            func.sum(case((Record.type == "expense", Record.amount_cent), else_=0)),
+            func.now(),
+        ).filter(
+            Record.user_id == uid,
+            Record.is_hidden == 0
+        ).group_by(Record.user_id, day_col)
+        db.session.execute(DailyStat.__table__.insert().from_select(
+            ["user_id", "day", "count", "income_cent", "expense_cent", "updated_at"], src
+        ))
+        _rebuild_monthly_stats(uid)
+        _commit(uid)
+    return len(user_ids)
+
+
+def _rebuild_monthly_stats(user_id: str):
+    """
+    由（刚重建的）日汇总重算该用户的月汇总，并重新评估各月预算（不提交）
+    """
+    MonthlyStat.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    months = {}
+    rows = db.session.query(
+        DailyStat.day, DailyStat.count, DailyStat.income_cent, DailyStat.expense_cent
+    ).filter(DailyStat.user_id == user_id).all()
+    for day, cnt, income, expense in rows:
+        acc = months.setdefault(_as_date(day).strftime("%Y-%m"), [0, 0, 0])
+        acc[0] += int(cnt or 0)
+        acc[1] += int(income or 0)
+        acc[2] += int(expense or 0)
+
+    now = datetime.utcnow()
+    if months:
+        db.session.execute(MonthlyStat.__table__.insert(), [
+            {"user_id": user_id, "month": m, "count": cnt, "income_cent": income,
+             "expense_cent": expense, "updated_at": now}
+            for m, (cnt, income, expense) in sorted(months.items())
+        ])
+    for b in Budget.query.filter_by(user_id=user_id).all():
+        _evaluate_budget(user_id, b.month, b)
+
+
+def _check_month(month: str) -> str:
+    """
+    校验并规范化 "YYYY-MM"
+    """
+    try:
+        start, _ = _month_range((month or "").strip())
+    except ValueError:
+        raise ValueError("month 格式应为 YYYY-MM")
+    return start.strftime("%Y-%m")
+
+
+def _month_range(month: str):
+    """
+    "YYYY-MM" => [当月1号, 下月1号)
+    """
     start = datetime.strptime(month + "-01", "%Y-%m-%d")
     if start.month == 12:
         end = datetime(start.year + 1, 1, 1)
     else:
         end = datetime(start.year, start.month + 1, 1)
+    return start, end
 
-    row = db.session.query(
-        func.sum(case((Record.type == "income", Record.amount_cent), else_=0)).label("income"),
-        func.sum(case((Record.type == "expense", Record.amount_cent), else_=0)).label("expense"),
-    ).filter(
-        Record.is_hidden == 0,
-        Record.user_id == user_id,
-        Record.occur_at >= start,
-        Record.occur_at < end
-    ).first()
 
-    income = int(row.income or 0)
-    expense = int(row.expense or 0)
-    return {"month": month, "income_cent": income, "expense_cent": expense, "balance_cent": income - expense}
+def _as_date(v):
+    # func.date 在 MySQL 返回 date，在 SQLite 返回字符串
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, str):
+        return datetime.strptime(v[:10], "%Y-%m-%d").date()
+    return v
+
+
+def _add_delta(deltas: dict, key, count: int, type_: str, amount: int):
+    d = deltas.setdefault(key, [0, 0, 0])
+    d[0] += count
+    if type_ == "income":
+        d[1] += amount
+    elif type_ == "expense":
+        d[2] += amount
+
+
+def _record_delta(r: Record, sign: int, deltas: dict = None) -> dict:
+    """
+    把一条记录对日汇总的贡献（sign=+1 加上 / -1 扣掉）累加到 deltas
+    deltas: {(user_id, date): [count, income_cent, expense_cent]}
+    """
+    deltas = {} if deltas is None else deltas
+    amount = int(r.amount_cent or 0)
+    _add_delta(deltas, (r.user_id, r.occur_at.date()), sign, r.type, sign * amount)
+    return deltas
+
+
+def _upsert(table, keys: dict, values: dict = None, incs: dict = None, sets: dict = None):
+    """
+    按唯一键 upsert（不提交）：
+    - 不存在：插入 keys + values + incs + sets
+    - 已存在：incs 中的列累加，sets 中的列覆盖；两者都为空时什么都不改
+    """
+    incs = incs or {}
+    sets = sets or {}
+    row = dict(values or {}, **keys, **incs, **sets)
+    dialect = db.engine.dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(**row)
+        update = {k: table.c[k] + stmt.inserted[k] for k in incs}
+        update.update({k: stmt.inserted[k] for k in sets})
+        if not update:
+            # 空操作，只为吞掉唯一键冲突
+            k = next(iter(keys))
+            update = {k: table.c[k]}
+        stmt = stmt.on_duplicate_key_update(update)
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(**row)
+        update = {k: table.c[k] + stmt.excluded[k] for k in incs}
+        update.update({k: stmt.excluded[k] for k in sets})
+        if update:
+            stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=update)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(keys))
+    db.session.execute(stmt)
+
+
+def _apply_daily_deltas(deltas: dict):
+    """
+    把 deltas 写进日汇总表和月汇总表，支出有变化的月份顺带检查预算（不提交，跟随调用方的事务）
+    """
+    now = datetime.utcnow()
+    months = {}
+    for (uid, d), (cnt, income, expense) in sorted(deltas.items()):
+        if not (cnt or income or expense):
+            continue
+        _upsert(
+            DailyStat.__table__,
+            {"user_id": uid, "day": d},
+            incs={"count": cnt, "income_cent": income, "expense_cent": expense},
+            sets={"updated_at": now},
+        )
+        acc = months.setdefault((uid, d.strftime("%Y-%m")), [0, 0, 0])
+        acc[0] += cnt
+        acc[1] += income
+        acc[2] += expense
+
+    for (uid, month), (cnt, income, expense) in sorted(months.items()):
+        if not (cnt or income or expense):
+            continue
+        _upsert(
+            MonthlyStat.__table__,
+            {"user_id": uid, "month": month},
+            incs={"count": cnt, "income_cent": income, "expense_cent": expense},
+            sets={"updated_at": now},
+        )
+        if expense:
+            _evaluate_budget(uid, month)
 
 
 def _parse_dt(s: str) -> datetime:
@@ -0,0 +1,112 @@
+# wxcloudrun/dbpool.py
+"""
+连接池监控：QueuePool 子类记录取连接的等待时间，池事件记录建连/失效次数
+数据按连接池统计（主库、只读实例分开），且按进程统计（每个 gunicorn worker 各自一份）
+"""
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+class PoolStats:
+    """
+    单个连接池的累计统计（主库、只读实例各一份）
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {
+            "checkouts": 0,        # 取连接次数
+            "connects": 0,         # 新建物理连接次数
+            "invalidations": 0,    # 连接失效（pre-ping 失败 / 断线）次数
+            "timeouts": 0,         # 池耗尽等待超时次数
+            "wait_ms_total": 0.0,  # 取连接累计等待（含新建连接耗时）
+            "wait_ms_max": 0.0,
+        }
+
+    def incr(self, key):
+        with self._lock:
+            self._data[key] += 1
+
+    def checkout(self, ms: float):
+        with self._lock:
+            self._data["checkouts"] += 1
+            self._data["wait_ms_total"] += ms
+            if ms > self._data["wait_ms_max"]:
+                self._data["wait_ms_max"] = ms
+
+    def on_connect(self, dbapi_conn, conn_record):
+        self.incr("connects")
+
+    def on_invalidate(self, dbapi_conn, conn_record, exception):
+        self.incr("invalidations")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._data)
+
+
+class TimedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        # recreate()（engine.dispose）时监听随 _dispatch 复制到新池，不重复注册
+        if kwargs.get("_dispatch") is None:
+            event.listen(self, "connect", self.stats.on_connect)
+            event.listen(self, "invalidate", self.stats.on_invalidate)
+
+    def recreate(self):
+        # 新池沿用同一份统计：累计值不因 dispose 清零，也和复制过去的监听对应
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.stats.incr("timeouts")
+            raise
+        finally:
+            self.stats.checkout((time.perf_counter() - t0) * 1000)
+
+
+def pool_status(engine) -> dict:
+    """
+    该 engine 自己连接池的统计（累计值 + 当前占用）
+    """
+    pool = engine.pool
+    out = getattr(pool, "stats", None) or PoolStats()
+    out = out.snapshot()
+    out["wait_ms_avg"] = out["wait_ms_total"] / out["checkouts"] if out["checkouts"] else 0.0
+    if isinstance(pool, QueuePool):
+        out.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    return out
+
+
+def warm_up(engine, n: int) -> int:
+    """
+    预先建立 n 个连接并放回池里（冷启动后第一批请求不用再等建连），返回实际建立的连接数
+    同时持有再一起归还，保证是 n 个不同的物理连接；失败只记日志，不影响启动
+    """
+    n = min(n, engine.pool.size()) if isinstance(engine.pool, QueuePool) else n
+    conns = []
+    try:
+        for _ in range(n):
+            conns.append(engine.connect())
+    except Exception as e:
+        logger.warning("db warm-up stopped after %d connection(s): %s", len(conns), e)
+    finally:
+        for c in conns:
+            c.close()
+    return len(conns)
@@ -0,0 +1,44 @@
+# wxcloudrun/etag.py
+"""
+按用户数据版本号（users.data_version）做条件请求：
+    @app.route(...)
+    @login_required
+    @versioned_etag
+    def xxx(): ...
+- 成功响应带弱 ETag：W/"<版本号>-<用户+URL 摘要>"
+- 请求头 If-None-Match 命中 => 直接 304，不执行视图里的查询和序列化
+版本号在视图执行前读取：读取之后若有写入，返回的 ETag 偏旧，下次只会多拉一次，不会误判 304
+"""
+import zlib
+from functools import wraps
+
+from flask import Response, g, request
+
+from wxcloudrun.dao import get_data_version
+
+
+def _etag_for(user_id: str, version: int) -> str:
+    scope = zlib.crc32(f"{user_id}|{request.full_path}".encode("utf-8"))
+    return f"{version}-{scope:08x}"
+
+
+def versioned_etag(f):
+    """
+    需放在 login_required 之后（依赖 g.user_id）
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        # 视图里可以复用（分类缓存键）
+        g.data_version = get_data_version(g.user_id)
+        etag = _etag_for(g.user_id, g.data_version)
+        if request.if_none_match.contains_weak(etag):
+            resp = Response(status=304)
+            resp.set_etag(etag, weak=True)
+            return resp
+
+        resp = f(*args, **kwargs)
+        if getattr(resp, "api_code", None) == 0 and resp.status_code == 200:
+            resp.set_etag(etag, weak=True)
+            resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+    return wrapper
@@ -0,0 +1,158 @@
+# wxcloudrun/importer.py
+"""
+CSV 批量导入（从其它记账 App 迁移）：
+- 逐行流式解析，不把整个文件读进内存
+- 分类按名称解析：一次性预加载用户全部分类，缺失的按 add_category 的规则新建
+- 每 chunk_size 行一次 executemany 插入并提交
+
+支持的表头（大小写不敏感，中英文均可）：
+    occur_at/date/time/日期/时间      必填，YYYY-MM-DD[ HH:MM:SS] 或 ISO，"/" 分隔也可以
+    type/类型/收支                    income/expense/收入/支出；缺省时按金额正负判断（负数为支出）
+    amount/金额                       元，最多两位小数
+    amount_cent                       分（与 amount 二选一，优先 amount_cent）
+    category/category_name_snapshot/分类
+    note/备注
+导出接口（/api/records/export?format=csv）产出的文件可以直接导入。
+"""
+import csv
+import io
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from wxcloudrun.dao import AMOUNT_CENT_MAX, _parse_dt, category_id_map, insert_records_chunk, resolve_category
+
+_ALIASES = {
+    "occur_at": ("occur_at", "date", "time", "datetime", "日期", "时间"),
+    "type": ("type", "类型", "收支"),
+    "amount": ("amount", "金额"),
+    "amount_cent": ("amount_cent",),
+    "category": ("category", "category_name_snapshot", "分类"),
+    "note": ("note", "备注"),
+}
+
+_TYPES = {"income": "income", "expense": "expense", "收入": "income", "支出": "expense"}
+
+DEFAULT_CATEGORY = {"income": "其他收入", "expense": "其他支出"}
+
+MAX_ERRORS = 100
+
+
+def _column_map(header: list) -> dict:
+    """
+    表头 => {标准字段: 列下标}
+    """
+    norm = [(h or "").strip().lstrip("\ufeff").lower() for h in header]
+    out = {}
+    for field, names in _ALIASES.items():
+        for i, h in enumerate(norm):
+            if h in names:
+                out[field] = i
+                break
+    if "occur_at" not in out:
+        raise ValueError("CSV 缺少日期列（occur_at/date/日期）")
+    if "amount" not in out and "amount_cent" not in out:
+        raise ValueError("CSV 缺少金额列（amount/amount_cent/金额）")
+    return out
+
+
+def parse_datetime(s: str) -> datetime:
+    """
+    _parse_dt 的快速路径：固定宽度的 "YYYY-MM-DD HH:MM:SS" / "YYYY-MM-DD" 直接切片，其余交给 _parse_dt
+    """
+    s = s.strip().replace("/", "-")
+    n = len(s)
+    try:
+        if n == 19 and s[4] == "-" and s[7] == "-" and s[10] == " " and s[13] == ":" and s[16] == ":":
+            return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                            int(s[11:13]), int(s[14:16]), int(s[17:19]))
+        if n == 10 and s[4] == "-" and s[7] == "-":
+            return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+    except ValueError:
+        pass
+    return _parse_dt(s)
+
+
+def _parse_row(row: list, cols: dict):
+    """
+    一行 CSV => (type, amount_cent, category_name, note, occur_at)，不合法抛 ValueError
+    """
+    def cell(field):
+        i = cols.get(field)
+        return row[i].strip() if i is not None and i < len(row) and row[i] is not None else ""
+
+    occur_at = parse_datetime(cell("occur_at"))
+
+    raw = cell("amount_cent")
+    try:
+        if raw:
+            amount_cent = int(raw)
+        else:
+            amount_cent = int((Decimal(cell("amount").replace(",", "")) * 100).to_integral_value())
+    except (InvalidOperation, ValueError):
+        raise ValueError("金额格式不正确")
+
+    t = cell("type").lower()
+    if t:
+        type_ = _TYPES.get(t)
+        if type_ is None:
+            raise ValueError("type 只能是 income/expense/收入/支出")
+    else:
+        type_ = "expense" if amount_cent < 0 else "income"
+    amount_cent = abs(amount_cent)
+    # 超过 INT 会让整块 INSERT 失败（已提交的块不回滚），在这里按行拒绝
+    if amount_cent > AMOUNT_CENT_MAX:
+        raise ValueError("金额超出范围")
+
+    category = cell("category") or DEFAULT_CATEGORY[type_]
+    note = cell("note")[:200] or None
+    return type_, amount_cent, category, note, occur_at
+
+
+def import_records_csv(user_id: str, stream, encoding: str = "utf-8-sig", chunk_size: int = 1000) -> dict:
+    """
+    stream: 二进制文件流（上传文件 / request.stream / open(path, "rb")）
+    返回：{"inserted", "skipped", "categories_created", "errors": [{"line", "error"}, ...]}
+    单行出错只跳过该行；已提交的块不会回滚
+    """
+    text = io.TextIOWrapper(stream, encoding=encoding, newline="")
+    reader = csv.reader(text)
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise ValueError("CSV 为空")
+    cols = _column_map(header)
+
+    cmap = category_id_map(user_id)
+    known = len(cmap)
+
+    inserted = skipped = 0
+    errors = []
+    chunk = []
+    for row in reader:
+        if not any(row):
+            continue
+        try:
+            type_, amount_cent, category, note, occur_at = _parse_row(row, cols)
+            cid = resolve_category(user_id, cmap, type_, category)
+        except ValueError as e:
+            skipped += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append({"line": reader.line_num, "error": str(e)})
+            continue
+
+        chunk.append({
+            "type": type_,
+            "amount_cent": amount_cent,
+            "category_id": cid,
+            "category_name_snapshot": category.strip(),
+            "note": note,
+            "occur_at": occur_at,
+        })
+        if len(chunk) >= chunk_size:
+            inserted += insert_records_chunk(user_id, chunk)
+            chunk = []
+
+    inserted += insert_records_chunk(user_id, chunk)
+
+    created = len(cmap) - known
+    return {"inserted": inserted, "skipped": skipped, "categories_created": created, "errors": errors}
@@ -1,13 +1,19 @@
 # wxcloudrun/jwt_utils.py
 import os
-import jwt
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
 JWT_SECRET = os.getenv("JWT_SECRET", "change-me")   # 建议云托管里配置成环境变量
 JWT_ALG = "HS256"
 JWT_EXPIRE_DAYS = int(os.getenv("JWT_EXPIRE_DAYS", "30"))
 
+# jwt 在第一次签发/校验时才导入，不拖慢冷启动
+
 def create_token(payload: dict) -> str:
+    import jwt
+
     data = dict(payload)
     data["iat"] = int(datetime.utcnow().timestamp())
     data["exp"] = datetime.utcnow() + timedelta(days=JWT_EXPIRE_DAYS)
@@ -18,5 +24,56 @@ def decode_token(token: str) -> dict:
     解码并校验 JWT
     - token 过期/非法会抛异常
     """
+    import jwt
+
     return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
 
+# ---------------- 已校验 token 的进程内缓存 ----------------
+# 同一个 token 在一个页面里会连续带 4~6 个请求，HMAC 校验结果可以直接复用；
+# 缓存到 exp 为止，超过容量按 LRU 淘汰。只缓存校验成功的 token。
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+
+_cache = OrderedDict()   # token -> (payload, exp)
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def decode_token_cached(token: str) -> dict:
+    """
+    带缓存的 decode_token，行为与 decode_token 一致（过期/非法抛异常）
+    返回的 payload 为共享对象，调用方不要修改
+    """
+    now = time.time()
+    with _cache_lock:
+        hit = _cache.get(token)
+        if hit is not None:
+            payload, exp = hit
+            if exp is None or now < exp:
+                _cache.move_to_end(token)
+                _cache_stats["hits"] += 1
+                return payload
+            # 已过期：移除后走完整校验（会抛出过期异常）
+            del _cache[token]
+        _cache_stats["misses"] += 1
+
+    payload = decode_token(token)
+
+    if JWT_CACHE_SIZE > 0:
+        exp = payload.get("exp")
+        with _cache_lock:
+            _cache[token] = (payload, float(exp) if exp is not None else None)
+            _cache.move_to_end(token)
+            while len(_cache) > JWT_CACHE_SIZE:
+                _cache.popitem(last=False)
+                _cache_stats["evictions"] += 1
+    return payload
+
+
+def token_cache_stats() -> dict:
+    with _cache_lock:
+        return dict(_cache_stats, size=len(_cache), capacity=JWT_CACHE_SIZE)
+
+
+def clear_token_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,189 @@
+# wxcloudrun/metrics.py
+"""
+请求级监控（按进程统计，每个 gunicorn worker 各自一份）：
+- before/after_request 钩子：按路由统计请求耗时直方图、状态码计数
+- SQLAlchemy 引擎事件：每个请求的 SQL 条数和数据库耗时，慢查询日志（带发起的路由）
+- render() 输出 Prometheus 文本格式，由 /metrics 接口返回（含连接池、JWT 缓存、分类缓存等统计）
+响应头 Server-Timing 带上本次请求的 db 耗时 / SQL 条数，小程序调试时可直接看到。
+流式响应（导出）只统计到开始返回为止。
+"""
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# 单个请求的 SQL 条数超过该值时打日志（排查 N+1）
+QUERY_COUNT_WARN = int(os.getenv("QUERY_COUNT_WARN", "50"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, name: str, help_: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help = help_
+        self.labels = labels
+        self.buckets = buckets
+        self._data = {}   # label values -> [bucket counts..., sum, count]
+
+    def observe(self, label_values: tuple, value: float):
+        with _lock:
+            d = self._data.get(label_values)
+            if d is None:
+                d = self._data[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    d[i] += 1
+            d[-2] += value
+            d[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = sorted((k, list(v)) for k, v in self._data.items())
+        for values, d in items:
+            base = _labels(self.labels, values)
+            for i, b in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + (_num(b),))} {d[i]}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + ('+Inf',))} {d[-1]}")
+            lines.append(f"{self.name}_sum{base} {_num(d[-2])}")
+            lines.append(f"{self.name}_count{base} {d[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_: str, labels: tuple):
+        self.name = name
+        self.help = help_
+        self.labels = labels
+        self._data = {}
+
+    def inc(self, label_values: tuple, n: float = 1):
+        with _lock:
+            self._data[label_values] = self._data.get(label_values, 0) + n
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = sorted(self._data.items())
+        lines.extend(f"{self.name}{_labels(self.labels, k)} {_num(v)}" for k, v in items)
+        return lines
+
+
+def _num(v) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "请求耗时", ("route", "method"), LATENCY_BUCKETS)
+REQUESTS = Counter("http_requests_total", "请求数", ("route", "method", "status"))
+REQUEST_QUERIES = Histogram("http_request_sql_queries", "每个请求的 SQL 条数", ("route",), QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram("http_request_db_seconds", "每个请求的数据库耗时", ("route",), LATENCY_BUCKETS)
+SQL_QUERIES = Counter("db_queries_total", "SQL 条数", ("route",))
+SLOW_QUERIES = Counter("db_slow_queries_total", "慢查询条数", ("route",))
+
+
+def _route() -> str:
+    if not has_request_context():
+        return "<no-request>"
+    rule = request.url_rule
+    return rule.rule if rule is not None else "<unmatched>"
+
+
+# ---------------- SQLAlchemy 引擎事件（对所有引擎生效，含只读实例） ----------------
+
+# 开始时间记在本条语句的执行上下文上（而不是连接上）：语句失败时上下文随之丢弃，
+# 不会在池里的连接上留下没配对的时间，影响这个连接后面的计时
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    route = _route()
+    SQL_QUERIES.inc((route,))
+    if has_request_context():
+        g._sql_count = g.get("_sql_count", 0) + 1
+        g._sql_time = g.get("_sql_time", 0.0) + elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc((route,))
+        logger.warning("slow query %.1fms route=%s: %s", elapsed * 1000, route, " ".join(statement.split())[:500])
+
+
+# ---------------- Flask 钩子 ----------------
+
+def _before_request():
+    g._req_start = time.perf_counter()
+    g._sql_count = 0
+    g._sql_time = 0.0
+
+
+def _after_request(resp):
+    start = g.get("_req_start")
+    if start is None:
+        return resp
+    elapsed = time.perf_counter() - start
+    route = _route()
+    n, db_time = g.get("_sql_count", 0), g.get("_sql_time", 0.0)
+
+    REQUEST_LATENCY.observe((route, request.method), elapsed)
+    REQUESTS.inc((route, request.method, str(resp.status_code)))
+    REQUEST_QUERIES.observe((route,), n)
+    REQUEST_DB_TIME.observe((route,), db_time)
+    if n > QUERY_COUNT_WARN:
+        logger.warning("request ran %d queries (%.1fms in db) route=%s %s", n, db_time * 1000, route, request.method)
+
+    resp.headers["Server-Timing"] = f'app;dur={elapsed * 1000:.1f}, db;dur={db_time * 1000:.1f};desc="{n} queries"'
+    return resp
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+
+# ---------------- /metrics ----------------
+
+def _gauges(name: str, help_: str, values: dict, label: str = None) -> list:
+    lines = [f"# HELP {name} {help_}", f"# TYPE {name} gauge"]
+    for k, v in sorted(values.items()):
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            lines.append(f'{name}{{{label or "key"}="{_escape(k)}"}} {_num(v)}')
+    return lines
+
+
+def render(extra: dict = None) -> str:
+    """
+    Prometheus 文本格式；extra: {指标名: (说明, {key: 数值})}，由调用方补充连接池 / 缓存等状态
+    """
+    lines = []
+    for m in (REQUEST_LATENCY, REQUESTS, REQUEST_QUERIES, REQUEST_DB_TIME, SQL_QUERIES, SLOW_QUERIES):
+        lines.extend(m.render())
+    for name, (help_, values) in sorted((extra or {}).items()):
+        lines.extend(_gauges(name, help_, values))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,116 @@
+# wxcloudrun/migrate.py
+"""
+数据库结构补齐（幂等）：
+- 表不存在 => 按模型建表（含索引）
+- 表已存在 => 补加模型里新增的列（新列需带 server_default 或可为空），补建缺失的索引
+  （分区表不支持的全文索引跳过，见 partition.py）
+- 新列的 server_default 对老数据不对时，按 BACKFILLS 回填（条件里排除已回填的行）
+可以重复执行，已存在的对象不会被改动。
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from wxcloudrun import db
+from wxcloudrun import model  # noqa: F401  确保所有模型已注册到 metadata
+from wxcloudrun.partition import is_partitioned
+
+
+def _tables():
+    return list(db.metadata.sorted_tables)
+
+
+# (名称, SQL)：都是幂等的 UPDATE，只改还没回填的行
+BACKFILLS = [
+    # 上线 categories_seeded 之前已有分类的老用户：不标记的话登录时会把改过名/删掉的预置分类又补回来
+    ("users.categories_seeded",
+     "UPDATE users SET categories_seeded = 1 WHERE categories_seeded = 0 "
+     "AND EXISTS (SELECT 1 FROM categories c WHERE c.user_id = users.user_id)"),
+    # 上线 hidden_at 之前进回收站的记录：隐藏时 updated_at 会被刷新，用它近似（回收站清理只按 hidden_at 判断）
+    ("records.hidden_at",
+     "UPDATE records SET hidden_at = updated_at WHERE is_hidden = 1 AND hidden_at IS NULL"),
+]
+
+
+def ensure_tables(engine=None) -> list:
+    """
+    建缺失的表，返回新建的表名列表
+    """
+    engine = engine or db.engine
+    insp = inspect(engine)
+    missing = [t for t in _tables() if not insp.has_table(t.name)]
+    if missing:
+        db.metadata.create_all(bind=engine, tables=missing)
+    return [t.name for t in missing]
+
+
+def ensure_columns(engine=None) -> list:
+    """
+    对已存在的表补加缺失的列，返回新加的列名列表（格式 table.column）
+    """
+    engine = engine or db.engine
+    insp = inspect(engine)
+    added = []
+    for table in _tables():
+        if not insp.has_table(table.name):
+            continue
+        existed = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existed:
+                continue
+            spec = CreateColumn(col).compile(dialect=engine.dialect)
+            table_name = engine.dialect.identifier_preparer.format_table(table)
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {spec}")
+            added.append(f"{table.name}.{col.name}")
+    return added
+
+
+def ensure_indexes(engine=None) -> list:
+    """
+    对已存在的表补建缺失的索引，返回新建的索引名列表（格式 table.index）
+    """
+    engine = engine or db.engine
+    insp = inspect(engine)
+    created = []
+    for table in _tables():
+        if not insp.has_table(table.name):
+            continue
+        existed = {ix.get("name") for ix in insp.get_indexes(table.name)}
+        partitioned = None
+        for ix in sorted(table.indexes, key=lambda x: x.name):
+            if ix.name in existed:
+                continue
+            if ix.dialect_options["mysql"]["prefix"] == "FULLTEXT":
+                if partitioned is None:
+                    partitioned = is_partitioned(engine, table.name)
+                if partitioned:
+                    continue
+            ix.create(bind=engine)
+            created.append(f"{table.name}.{ix.name}")
+    return created
+
+
+def backfill(engine=None) -> list:
+    """
+    回填老数据，返回有改动的项（格式 "table.column: 行数"）
+    """
+    engine = engine or db.engine
+    done = []
+    for name, sql in BACKFILLS:
+        with engine.begin() as conn:
+            n = conn.execute(text(sql)).rowcount
+        if n:
+            done.append(f"{name}: {n}")
+    return done
+
+
+def migrate(engine=None) -> dict:
+    """
+    一次性补齐：先建表，再补列，再补索引，最后回填老数据
+    """
+    engine = engine or db.engine
+    tables = ensure_tables(engine)
+    columns = ensure_columns(engine)
+    indexes = ensure_indexes(engine)
+    backfilled = backfill(engine)
+    return {"tables": tables, "columns": columns, "indexes": indexes, "backfilled": backfilled}
@@ -12,6 +12,10 @@ class User(db.Model):
     status = db.Column(db.SmallInteger, default=1, nullable=False)
     phone = db.Column(db.String(20), nullable=True, unique=True, comment='手机号')
     email = db.Column(db.String(100), nullable=True, unique=True, comment='邮箱')
+    # 预置分类是否已补齐：补齐后登录不再检查分类
+    categories_seeded = db.Column(db.SmallInteger, default=0, server_default='0', nullable=False)
+    # 数据版本号：该用户的记录/分类/预算每次写入 +1，读接口据此生成 ETag
+    data_version = db.Column(db.BigInteger, default=0, server_default='0', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
@@ -29,6 +33,11 @@ class Category(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        # list_categories：按用户 + 类型 + 是否隐藏过滤，按 sort 排序
+        db.Index('ix_categories_user_type_hidden_sort', 'user_id', 'type', 'is_hidden', 'sort'),
+    )
+
 class Record(db.Model):
     __tablename__ = 'records'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
@@ -40,9 +49,23 @@ class Record(db.Model):
     note = db.Column(db.String(200))
     occur_at = db.Column(db.DateTime, nullable=False)
     is_hidden = db.Column(db.SmallInteger, default=0, nullable=False)
+    # 进回收站的时间（UTC），回收站清理按它判断是否过了保留期；老数据为空时按 updated_at
+    hidden_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        # list_records / 日历 / 日、月汇总：user_id + is_hidden 等值，occur_at 范围，(occur_at, id) 排序
+        db.Index('ix_records_user_hidden_occur', 'user_id', 'is_hidden', 'occur_at', 'id'),
+        # count_records_by_category / sync_records_for_category
+        db.Index('ix_records_user_category', 'user_id', 'category_id'),
+        # 回收站清理（purge.py）：is_hidden 等值 + hidden_at 范围，按 (hidden_at, id) 翻页，不扫全表
+        db.Index('ix_records_hidden_at', 'is_hidden', 'hidden_at', 'id'),
+        # 备注 / 分类名搜索：MySQL 全文索引（ngram 分词，支持中文）；其他数据库上只是普通索引
+        db.Index('ft_records_note_category', 'note', 'category_name_snapshot',
+                 mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
+
 class Budget(db.Model):
     __tablename__ = 'budgets'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
@@ -54,6 +77,11 @@ class Budget(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        # 每个用户每月一条预算；记账时按 (user_id, month) 直接定位
+        db.Index('uq_budgets_user_month', 'user_id', 'month', unique=True),
+    )
+
 class Receipt(db.Model):
     __tablename__ = 'receipts'
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
@@ -63,3 +91,43 @@ class Receipt(db.Model):
     mime_type = db.Column(db.String(50))                   # image/jpeg
     size_bytes = db.Column(db.BigInteger)                  # 文件大小
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # 详情页按 user_id + record_id 拉凭证
+        db.Index('ix_receipts_user_record', 'user_id', 'record_id'),
+    )
+
+class DailyStat(db.Model):
+    """
+    按用户 + 天的收支汇总（只统计未隐藏记录），由 dao 中的记录写操作在同一事务里增量维护
+    """
+    __tablename__ = 'daily_stats'
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(64), db.ForeignKey('users.user_id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    income_cent = db.Column(db.BigInteger, default=0, nullable=False)
+    expense_cent = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # 增量 upsert 依赖的唯一键，同时服务按月/按天的范围查询
+        db.Index('uq_daily_stats_user_day', 'user_id', 'day', unique=True),
+    )
+
+class MonthlyStat(db.Model):
+    """
+    按用户 + 月的收支汇总，和日汇总在同一事务里增量维护；预算检查 / 月汇总直接按唯一键读一行
+    """
+    __tablename__ = 'monthly_stats'
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(64), db.ForeignKey('users.user_id'), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    count = db.Column(db.Integer, default=0, nullable=False)
+    income_cent = db.Column(db.BigInteger, default=0, nullable=False)
+    expense_cent = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('uq_monthly_stats_user_month', 'user_id', 'month', unique=True),
+    )
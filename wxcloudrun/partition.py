@@ -0,0 +1,204 @@
+# wxcloudrun/partition.py
+"""
+records 表按 occur_at 做 MySQL RANGE COLUMNS 分区（可选，只支持 MySQL）：
+- 按月（p202410 存 2024-10 的记录）或按年（p2024）分区，最后一个 pmax 兜底更晚的时间
+- 第一个分区同时存放更早的全部记录，补录很久以前的账不会因为没有分区而失败
+
+分区表的限制（转换时一并处理）：
+- 不能有外键，也不能被外键引用 => 删掉 records 上的外键和 receipts.record_id 外键，关联靠代码保证
+- 所有唯一键必须包含分区列 => 主键改为 (id, occur_at)，id 仍自增、仍唯一
+- 不支持 FULLTEXT 索引 => 删掉 ft_records_note_category，记录搜索回退到 LIKE（dao._search_condition），
+  搜索变成按用户扫描全部记录；必须显式传 accept_no_fulltext=True（--accept-no-fulltext）才会生成转换 SQL，
+  转换后应用启动时会打 error 日志提醒
+
+分区裁剪：查询条件里要有 occur_at 的直接范围（occur_at >= :start AND occur_at < :end），
+不能包在函数里（DATE(occur_at) 之类）。按月/按天的列表、游标翻页（occur_at <= 游标）、分类占比都满足；
+日历 / 月汇总读的是汇总表，不扫 records。只按 id 定位的单条查询（详情、修改、删除）会在每个分区各查一次主键。
+
+转换要整表重建（ALTER TABLE ... PARTITION BY），大表请在低峰期执行或用 gh-ost / pt-osc 之类的工具按打印出的 SQL 操作。
+"""
+from datetime import date, datetime
+
+from sqlalchemy import inspect, text
+
+from wxcloudrun import db
+
+TABLE = "records"
+COLUMN = "occur_at"
+FULLTEXT_INDEX = "ft_records_note_category"
+MAX_PARTITION = "pmax"
+GRANULARITIES = ("month", "year")
+# 按月分区时最早的分区不早于这么多年前（更早的记录都放在第一个分区里），避免分区数过多
+MAX_HISTORY_YEARS = 10
+
+
+def _check_mysql(engine):
+    if engine.dialect.name != "mysql":
+        raise ValueError("分区只支持 MySQL")
+
+
+def _floor(d: date, granularity: str) -> date:
+    return date(d.year, 1, 1) if granularity == "year" else date(d.year, d.month, 1)
+
+
+def _next(d: date, granularity: str) -> date:
+    if granularity == "year":
+        return date(d.year + 1, 1, 1)
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def _name(d: date, granularity: str) -> str:
+    return d.strftime("p%Y") if granularity == "year" else d.strftime("p%Y%m")
+
+
+def _parse_name(name: str):
+    """
+    分区名 => (起始日期, 粒度)；pmax 等非日期分区返回 (None, None)
+    """
+    digits = name[1:]
+    if name.startswith("p") and digits.isdigit():
+        if len(digits) == 4:
+            return date(int(digits), 1, 1), "year"
+        if len(digits) == 6:
+            return date(int(digits[:4]), int(digits[4:]), 1), "month"
+    return None, None
+
+
+def _definition(start: date, granularity: str) -> str:
+    return f"PARTITION {_name(start, granularity)} VALUES LESS THAN ('{_next(start, granularity).isoformat()}')"
+
+
+def _definitions(start: date, until: date, granularity: str) -> list:
+    """
+    从 start 所在分区到 until 所在分区（含）的分区定义
+    """
+    out = []
+    d = _floor(start, granularity)
+    while d <= until:
+        out.append(_definition(d, granularity))
+        d = _next(d, granularity)
+    return out
+
+
+def _add_ahead(d: date, granularity: str, ahead: int) -> date:
+    for _ in range(ahead):
+        d = _next(d, granularity)
+    return d
+
+
+def partitions(engine=None) -> list:
+    """
+    records 的分区列表（按顺序）：[{"name", "less_than", "rows"}, ...]；未分区时为空列表
+    rows 是 information_schema 的估算值
+    """
+    engine = engine or db.engine
+    if engine.dialect.name != "mysql":
+        return []
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ), {"t": TABLE}).all()
+    return [{"name": r[0], "less_than": (r[1] or "").strip("'"), "rows": int(r[2] or 0)} for r in rows]
+
+
+def is_partitioned(engine=None, table: str = TABLE) -> bool:
+    engine = engine or db.engine
+    if engine.dialect.name != "mysql":
+        return False
+    with engine.connect() as conn:
+        n = conn.execute(text(
+            "SELECT COUNT(*) FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND PARTITION_NAME IS NOT NULL"
+        ), {"t": table}).scalar()
+    return bool(n)
+
+
+def partition_sql(engine=None, granularity: str = "month", ahead: int = 3, since: date = None,
+                  accept_no_fulltext: bool = False) -> list:
+    """
+    把未分区的 records 转成分区表的 SQL（按顺序执行）
+    - 第一个分区从 since（默认最早一条记录所在的月/年，最早 MAX_HISTORY_YEARS 年前）开始
+    - 预建到当前月/年之后 ahead 个分区，另加 pmax
+    - records 上有全文索引时，accept_no_fulltext=False 直接拒绝（转换会删掉它）
+    """
+    engine = engine or db.engine
+    _check_mysql(engine)
+    if granularity not in GRANULARITIES:
+        raise ValueError("分区粒度只能是 month 或 year")
+    if ahead < 0:
+        raise ValueError("ahead 不能小于 0")
+    if is_partitioned(engine):
+        raise ValueError("records 已经是分区表")
+
+    today = date.today()
+    if since is None:
+        with engine.connect() as conn:
+            oldest = conn.execute(text(f"SELECT MIN({COLUMN}) FROM {TABLE}")).scalar()
+        since = oldest.date() if isinstance(oldest, datetime) else (oldest or today)
+        since = max(since, date(today.year - MAX_HISTORY_YEARS, 1, 1))
+    until = _add_ahead(_floor(today, granularity), granularity, ahead)
+
+    insp = inspect(engine)
+    stmts = []
+    # 引用 records 的外键（receipts.record_id），以及 records 自己的外键
+    for t in insp.get_table_names():
+        for fk in insp.get_foreign_keys(t):
+            if fk.get("referred_table") == TABLE and t != TABLE and fk.get("name"):
+                stmts.append(f"ALTER TABLE `{t}` DROP FOREIGN KEY `{fk['name']}`")
+    for fk in insp.get_foreign_keys(TABLE):
+        if fk.get("name"):
+            stmts.append(f"ALTER TABLE `{TABLE}` DROP FOREIGN KEY `{fk['name']}`")
+
+    alters = []
+    if FULLTEXT_INDEX in {ix.get("name") for ix in insp.get_indexes(TABLE)}:
+        if not accept_no_fulltext:
+            raise ValueError(f"分区表不支持全文索引，转换会删掉 {FULLTEXT_INDEX}，记录搜索将退化为 LIKE 扫描；"
+                             "确认接受请加 --accept-no-fulltext")
+        alters.append(f"DROP INDEX `{FULLTEXT_INDEX}`")
+    pk = insp.get_pk_constraint(TABLE).get("constrained_columns") or []
+    if COLUMN not in pk:
+        alters.append(f"DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `{COLUMN}`)")
+    defs = _definitions(since, until, granularity) + [f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)"]
+    stmts.append(
+        f"ALTER TABLE `{TABLE}` " + (", ".join(alters) + " " if alters else "")
+        + f"PARTITION BY RANGE COLUMNS(`{COLUMN}`) (\n  " + ",\n  ".join(defs) + "\n)"
+    )
+    return stmts
+
+
+def future_partitions_sql(engine=None, ahead: int = 3) -> list:
+    """
+    预建未来分区的 SQL：保证当前月/年之后至少还有 ahead 个分区（从 pmax 里拆出来，pmax 为空时很快）
+    已经够了返回空列表
+    """
+    engine = engine or db.engine
+    _check_mysql(engine)
+    parts = partitions(engine)
+    if not parts:
+        raise ValueError("records 还不是分区表，先执行 flask records-partition")
+
+    last, granularity = None, None
+    for p in parts:
+        start, g = _parse_name(p["name"])
+        if start is not None:
+            last, granularity = start, g
+    if last is None:
+        raise ValueError("无法识别现有分区的命名（应为 pYYYYMM 或 pYYYY）")
+
+    until = _add_ahead(_floor(date.today(), granularity), granularity, ahead)
+    defs = _definitions(_next(last, granularity), until, granularity)
+    if not defs:
+        return []
+    if parts[-1]["name"] == MAX_PARTITION:
+        defs.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+        return [f"ALTER TABLE `{TABLE}` REORGANIZE PARTITION {MAX_PARTITION} INTO (\n  " + ",\n  ".join(defs) + "\n)"]
+    return [f"ALTER TABLE `{TABLE}` ADD PARTITION (\n  " + ",\n  ".join(defs) + "\n)"]
+
+
+def execute(stmts: list, engine=None):
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        for sql in stmts:
+            conn.exec_driver_sql(sql)
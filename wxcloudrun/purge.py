@@ -0,0 +1,116 @@
+# wxcloudrun/purge.py
+"""
+回收站清理：彻底删除进回收站（is_hidden=1）超过保留期的记录及其凭证
+- 按 (hidden_at, id) 顺序小批量处理，走 ix_records_hidden_at 只读过期的那一段索引：
+  每批先只读地找出候选 id，再在短事务里 FOR UPDATE 锁住并复核（期间被恢复的不删），
+  删凭证、删记录、受影响用户的 data_version +1（回收站列表的 ETag 失效），提交
+- 批次之间暂停（不少于 PURGE_PAUSE_MS，也不少于上一批的耗时），避免长时间占锁、只读实例同步延迟
+- 被删记录早已不计入日/月汇总（隐藏时已扣减），汇总表不用动
+- 云存储里的凭证文件不在这里删：on_files 回调拿到每批被删凭证的 file_id，由调用方处理
+- 只按 hidden_at 判断：上线 hidden_at 之前隐藏的老记录由 db-migrate 回填（见 migrate.BACKFILLS）
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, true
+
+from wxcloudrun import db
+from wxcloudrun.dao import _bump_data_version
+from wxcloudrun.model import Receipt, Record
+
+logger = logging.getLogger(__name__)
+
+
+def _expired(cutoff: datetime):
+    # is_hidden 等值 + hidden_at 范围：ix_records_hidden_at 的前两列（hidden_at 为 NULL 的不会命中）
+    return and_(Record.is_hidden == 1, Record.hidden_at < cutoff)
+
+
+def _after(hidden_at: datetime, record_id: int):
+    # 游标：(hidden_at, id) 严格大于上一批最后一条
+    if hidden_at is None:
+        return true()
+    return or_(Record.hidden_at > hidden_at, and_(Record.hidden_at == hidden_at, Record.id > record_id))
+
+
+def purge_hidden_records(retention_days: int = None, batch_size: int = None, pause_ms: int = None,
+                         max_seconds: float = None, dry_run: bool = False, on_files=None) -> dict:
+    """
+    彻底删除回收站里超过 retention_days 天的记录和凭证，参数默认取配置（RECYCLE_RETENTION_DAYS 等）
+    - max_seconds：运行时间上限，到时间停在批次边界，返回 done=False，下次再跑会接着删
+    - dry_run：只统计会删除多少，不删除
+    返回：{"records", "receipts", "receipt_bytes", "users", "batches", "seconds", "cutoff", "done", "dry_run"}
+    """
+    cfg = current_app.config
+    retention_days = cfg["RECYCLE_RETENTION_DAYS"] if retention_days is None else int(retention_days)
+    batch_size = cfg["PURGE_BATCH_SIZE"] if batch_size is None else int(batch_size)
+    pause = (cfg["PURGE_PAUSE_MS"] if pause_ms is None else int(pause_ms)) / 1000.0
+    if retention_days < 1:
+        raise ValueError("保留天数至少为 1")
+    if not 1 <= batch_size <= 5000:
+        raise ValueError("batch_size 需在 1~5000 之间")
+
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    expired = _expired(cutoff)
+    out = {"records": 0, "receipts": 0, "receipt_bytes": 0, "users": 0, "batches": 0}
+    users = set()
+    started = time.monotonic()
+    last = (None, 0)
+    done = False
+
+    while True:
+        if max_seconds is not None and time.monotonic() - started >= max_seconds:
+            break
+
+        # 只读找候选（不加锁），读完立即结束事务，不长时间持有快照
+        page = db.session.query(Record.hidden_at, Record.id) \
+            .filter(expired, _after(*last)) \
+            .order_by(Record.hidden_at.asc(), Record.id.asc()).limit(batch_size).all()
+        db.session.rollback()
+        if not page:
+            done = True
+            break
+        ids = [rid for _, rid in page]
+        last = tuple(page[-1])
+
+        t0 = time.monotonic()
+        q = db.session.query(Record.id, Record.user_id).filter(Record.id.in_(ids), expired)
+        rows = q.all() if dry_run else q.with_for_update().all()
+        rids = [r.id for r in rows]
+        uids = sorted({r.user_id for r in rows})
+        if rids:
+            # (user_id, record_id) 条件让凭证查询走 ix_receipts_user_record
+            receipts = db.session.query(Receipt.file_id, Receipt.size_bytes).filter(
+                Receipt.user_id.in_(uids), Receipt.record_id.in_(rids)).all()
+            if not dry_run:
+                Receipt.query.filter(Receipt.user_id.in_(uids), Receipt.record_id.in_(rids)) \
+                    .delete(synchronize_session=False)
+                Record.query.filter(Record.id.in_(rids)).delete(synchronize_session=False)
+                _bump_data_version(uids)
+                db.session.commit()
+            else:
+                db.session.rollback()
+
+            out["records"] += len(rids)
+            out["receipts"] += len(receipts)
+            out["receipt_bytes"] += sum(int(size or 0) for _, size in receipts)
+            users.update(uids)
+            if on_files is not None and receipts:
+                on_files([fid for fid, _ in receipts])
+        else:
+            db.session.rollback()
+        out["batches"] += 1
+
+        if len(ids) < batch_size:
+            done = True
+            break
+        time.sleep(max(pause, time.monotonic() - t0))
+
+    out.update(users=len(users), seconds=round(time.monotonic() - started, 2),
+               cutoff=cutoff.strftime("%Y-%m-%d %H:%M:%S"), done=done, dry_run=dry_run)
+    if out["records"] and not dry_run:
+        logger.info("purged %d hidden record(s), %d receipt(s), %d bytes, %d user(s) in %.1fs",
+                    out["records"], out["receipts"], out["receipt_bytes"], out["users"], out["seconds"])
+    return out
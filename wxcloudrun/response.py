@@ -1,16 +1,66 @@
 # wxcloudrun/response.py
 import json
+from datetime import date, datetime
+from decimal import Decimal
+
 from flask import Response
 
+try:
+    import orjson  # 可选：装了就用，序列化快很多
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class Rows:
+    """
+    列表接口的行数据：字段名 + 行元组（如 SQLAlchemy 查询返回的 Row），
+    按列式输出 {"fields": [...], "rows": [[...], ...]}：行元组整体交给编码器，不逐行构造对象
+    """
+    __slots__ = ("fields", "rows")
+
+    def __init__(self, fields, rows):
+        self.fields = tuple(fields)
+        self.rows = rows
+
+
+def _default(o):
+    # 时间统一输出为 "YYYY-MM-DD HH:MM:SS"
+    if isinstance(o, datetime):
+        return o.isoformat(" ", "seconds")
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, Rows):
+        # Row 不是 tuple 子类，orjson 不认；转成元组后整块序列化
+        return {"fields": o.fields, "rows": [tuple(r) for r in o.rows]}
+    if isinstance(o, Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTS)
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def make_json_response(payload, status: int = 200):
+    resp = Response(dumps(payload), status=status, mimetype='application/json')
+    resp.api_code = payload.get('code')  # 业务码，供 ETag 等只处理成功响应的逻辑判断
+    return resp
+
 def make_succ_response(data):
     payload = {'code': 0, 'data': data}
-    return Response(json.dumps(payload, ensure_ascii=False), mimetype='application/json')
+    return make_json_response(payload)
 
 def make_err_response(err_msg):
     payload = {'code': -1, 'errorMsg': err_msg}
-    return Response(json.dumps(payload, ensure_ascii=False), mimetype='application/json')
+    return make_json_response(payload)
 
 # ✅ 登录接口专用：匹配前端 data.msg / data.token
 def make_login_response(token: str, user: dict, msg: str = '登录成功'):
     payload = {'code': 0, 'msg': msg, 'token': token, 'data': user}
-    return Response(json.dumps(payload, ensure_ascii=False), mimetype='application/json')
+    return make_json_response(payload)
@@ -0,0 +1,49 @@
+# wxcloudrun/routing.py
+"""
+读写分离：配置了只读实例（SQLALCHEMY_BINDS["replica"]）时，
+在 replica_reads() 范围内的查询走只读实例，其余（以及所有写入/flush）走主库
+"""
+from contextlib import contextmanager
+
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm
+
+REPLICA_BIND = "replica"
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (self.info.get("use_replica") and not self._flushing
+                and REPLICA_BIND in (self.app.config.get("SQLALCHEMY_BINDS") or {})):
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper=mapper, clause=clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+@contextmanager
+def replica_reads(session, enabled: bool = True):
+    """
+    范围内的查询走只读实例（未配置只读实例时无效果）；enabled=False 时范围内强制走主库
+    """
+    info = session().info
+    prev = info.get("use_replica", False)
+    info["use_replica"] = enabled
+    try:
+        yield
+    finally:
+        info["use_replica"] = prev
+
+
+def primary_reads(session):
+    """
+    范围内的查询走主库（即使外层在 replica_reads 范围内）
+    """
+    return replica_reads(session, enabled=False)
@@ -1,111 +1,93 @@
 # wxcloudrun/views.py
-import os
-import requests
-from flask import request
-from run import app
-from wxcloudrun.response import make_succ_response, make_err_response, make_login_response
-from wxcloudrun.jwt_utils import create_token,decode_token
-from wxcloudrun.model import User,Receipt
+import csv
+import io
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, current_app, g, request, stream_with_context
+from wxcloudrun import db, metrics
+from wxcloudrun.auth import current_user, internal_required, login_required
+from wxcloudrun.cache import category_cache
+from wxcloudrun.dbpool import pool_status
+from wxcloudrun.etag import versioned_etag
+from wxcloudrun.importer import import_records_csv
+from wxcloudrun.purge import purge_hidden_records
+from wxcloudrun.wechat import WX_APPID, WX_SECRET, get_client as get_wx_client
+from wxcloudrun.response import Rows, dumps, make_succ_response, make_err_response, make_login_response
+from wxcloudrun.jwt_utils import create_token, token_cache_stats
+from wxcloudrun.model import User
 
 from wxcloudrun.dao import (
+    add_budget,
+    attach_receipt_summary,
+    delete_budget,
+    get_budget,
+    list_budgets,
+    update_budget,
     calendar_summary,
+    category_breakdown,
     day_summary,
     delete_category,
     delete_record,
     get_category,
     get_or_create_user_by_openid,
     get_record_by_id,
-    list_categories,
+    iter_export_chunks,
+    list_category_dicts,
     add_record,
     add_category, 
     list_records,
+    list_records_after,
+    list_receipts,
+    RECORD_LIST_FIELDS,
+    RECORD_RECEIPT_FIELDS,
     month_summary,
     restore_record,
     seed_default_categories,
+    series_summary,
     sync_record_receipts,
     update_category,
     update_record,
-    add_record_with_receipts
+    add_record_with_receipts,
+    add_records_batch
 )
 
+bp = Blueprint("api", __name__)
 
-WX_APPID = os.getenv('WX_APPID', 'wxf2ad56f65cb79fee')
-WX_SECRET = os.getenv('WX_SECRET', '8eda8e66f289fe0fc3dbd36919b3fb28')
 
-def _get_token():
-    auth = request.headers.get("Authorization", "")
-    if auth.startswith("Bearer "):
-        return auth[7:].strip()
-
-    t = request.headers.get("token")  # 兼容你 app.js 可能用 token 头
-    if t:
-        return t.strip()
-
-    t = request.args.get("token")
-    if t:
-        return t.strip()
-
-    return ""
-
-def _current_user_id():
-    token = _get_token()
-    if not token:
-        return None, "未登录：缺少token"
-    try:
-        payload = decode_token(token)
-    except Exception:
-        return None, "token无效或已过期"
-    uid = payload.get("user_id")
-    if not uid:
-        return None, "token缺少user_id"
-    return uid, None
-
-
-
-@app.route('/api/categories', methods=['GET'])
+@bp.route('/api/categories', methods=['GET'])
+@login_required
+@versioned_etag
 def categories_get():
     # ✅ 从 token 取当前用户
-    token = _get_token()
-    if not token:
-        return make_err_response("未登录：缺少token")
-
-    try:
-        payload = decode_token(token)
-    except Exception:
-        return make_err_response("token无效或已过期")
-
-    user_id = payload.get("user_id")
-    if not user_id:
-        return make_err_response("token缺少user_id")
+    user_id = g.user_id
 
     # 参数：income/expense/None
     type_ = request.args.get('type')
 
-    # ✅ 查分类
-    items = list_categories(user_id, type_=type_, include_hidden=False)
+    # ✅ 查分类（走缓存，按 type 过滤在内存里做）
+    items = list_category_dicts(user_id, type_=type_, version=g.get("data_version"))
 
     # ✅ 如果没有分类，自动补齐（老用户也能恢复）
     if not items:
-        seed_default_categories(user_id)
-        items = list_categories(user_id, type_=type_, include_hidden=False)
+        seed_default_categories(user_id, force=True)
+        items = list_category_dicts(user_id, type_=type_)
 
     data = [{
-        'id': c.id,
-        'type': c.type,
-        'name': c.name,
-        'icon': c.icon,
-        'color': getattr(c, 'color', None),
-        'is_hidden': c.is_hidden,
-        'sort': c.sort
+        'id': c['id'],
+        'type': c['type'],
+        'name': c['name'],
+        'icon': c['icon'],
+        'color': c['color'],
+        'is_hidden': c['is_hidden'],
+        'sort': c['sort']
     } for c in items]
 
     return make_succ_response(data)
 
-@app.route('/api/categories', methods=['POST'])
+@bp.route('/api/categories', methods=['POST'])
+@login_required
 def categories_add():
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     params = request.get_json() or {}
     type_ = params.get("type")
@@ -143,11 +125,10 @@ def categories_add():
         "sort": c.sort
     })
 
-@app.route('/api/categories/<int:cid>', methods=['GET'])
+@bp.route('/api/categories/<int:cid>', methods=['GET'])
+@login_required
 def category_get_one(cid):
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     try:
         c = get_category(user_id, cid)
@@ -167,11 +148,10 @@ def category_get_one(cid):
 
 
 
-@app.route('/api/categories/<int:cid>', methods=['PUT'])
+@bp.route('/api/categories/<int:cid>', methods=['PUT'])
+@login_required
 def category_update(cid):
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     params = request.get_json() or {}
 
@@ -251,11 +231,10 @@ def category_update(cid):
     })
 
 
-@app.route('/api/categories/<int:cid>', methods=['DELETE'])
+@bp.route('/api/categories/<int:cid>', methods=['DELETE'])
+@login_required
 def category_delete(cid):
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     try:
         delete_category(user_id, cid)
@@ -265,11 +244,10 @@ def category_delete(cid):
     return make_succ_response({"ok": True})
 
 
-@app.route('/api/records', methods=['POST'])
+@bp.route('/api/records', methods=['POST'])
+@login_required
 def records_add():
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     params = request.get_json() or {}
     required = ['type', 'amount_cent', 'category_id', 'occur_at']
@@ -294,46 +272,236 @@ def records_add():
     )
     return make_succ_response({'id': r.id})
 
-@app.route('/api/records', methods=['GET'])
+@bp.route('/api/records/batch', methods=['POST'])
+@login_required
+def records_add_batch():
+    """
+    批量记账（离线同步 / 账单导入）：{"records": [{type, amount_cent, category_id, occur_at, note?, receipts?}, ...]}
+    逐条返回 id 或错误信息，合法的记录在一个事务里写入
+    """
+    user_id = g.user_id
+
+    params = request.get_json() or {}
+    items = params.get("records")
+    if not isinstance(items, list) or not items:
+        return make_err_response("records 必须是非空数组")
+
+    try:
+        results = add_records_batch(user_id, items)
+    except Exception as e:
+        return make_err_response(str(e))
+
+    failed = sum(1 for x in results if "error" in x)
+    return make_succ_response({
+        "items": results,
+        "created": len(results) - failed,
+        "failed": failed
+    })
+
+def _list_rows(user_id, items):
+    """
+    include_receipts=1 时每行追加凭证数和第一张凭证（整页一次查询）
+    layout=columns 时按列式返回 {"fields": [...], "rows": [[...], ...]}（不逐行构造对象，序列化快得多），
+    默认仍是对象数组（兼容老版本前端）
+    """
+    fields = RECORD_LIST_FIELDS
+    if request.args.get("include_receipts") in ("1", "true"):
+        fields = RECORD_LIST_FIELDS + RECORD_RECEIPT_FIELDS
+        items = attach_receipt_summary(user_id, items)
+    if request.args.get("layout") == "columns":
+        return Rows(fields, items)
+    return [dict(zip(fields, r)) for r in items]
+
+PAGE_SIZE_MAX = 100
+
+
+def _int_arg(name: str, default: int, lo: int, hi: int = None) -> int:
+    """
+    整数查询参数，超出范围的收到 [lo, hi] 内；不是整数时抛 ValueError
+    """
+    try:
+        v = int(request.args.get(name, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} 必须是整数")
+    v = max(lo, v)
+    return min(hi, v) if hi is not None else v
+
+
+def _records_page(user_id, month=None, day=None, only_hidden=False, keyword=None):
+    """
+    列表分页公共逻辑：
+    - 带 cursor 参数（可为空串表示第一页）或是搜索 => 游标分页，返回 next_cursor，不做 COUNT（with_total=1 时才统计）
+    - 否则 => 老的页码分页
+    - include_receipts=1 => 每行带 receipt_count / first_receipt_file_id
+    - layout=columns => items 为列式 {"fields", "rows"}
+    - page_size 收到 1~PAGE_SIZE_MAX，page 至少为 1
+    """
+    try:
+        page_size = _int_arg("page_size", 20, 1, PAGE_SIZE_MAX)
+        page = _int_arg("page", 1, 1)
+    except ValueError as e:
+        return make_err_response(str(e))
+
+    if "cursor" in request.args or keyword is not None:
+        with_total = request.args.get("with_total") in ("1", "true")
+        try:
+            items, next_cursor, total = list_records_after(
+                user_id, month=month, day=day,
+                cursor=request.args.get("cursor"),
+                page_size=page_size,
+                only_hidden=only_hidden,
+                with_total=with_total,
+                keyword=keyword
+            )
+        except Exception as e:
+            return make_err_response(str(e))
+
+        data = {
+            "items": _list_rows(user_id, items),
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
+            "page_size": page_size
+        }
+        if with_total:
+            data["total"] = total
+        return make_succ_response(data)
+
+    items, total = list_records(user_id, month=month, day=day, page=page, page_size=page_size,
+                                only_hidden=only_hidden)
+    return make_succ_response({
+        "items": _list_rows(user_id, items), "total": total, "page": page, "page_size": page_size
+    })
+
+
+@bp.route('/api/records', methods=['GET'])
+@login_required
+@versioned_etag
 def records_list():
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     month = request.args.get("month")  # "YYYY-MM"
     day = request.args.get("day")  # "YYYY-MM-DD"
-    page = int(request.args.get("page", "1"))
-    page_size = int(request.args.get("page_size", "20"))
 
-    items, total = list_records(user_id, month=month, day=day, page=page, page_size=page_size)
+    return _records_page(user_id, month=month, day=day)
+
+
+@bp.route('/api/records/search', methods=['GET'])
+@login_required
+@versioned_etag
+def records_search():
+    """
+    GET /api/records/search?q=午饭&cursor=&month=2024-01
+    按备注 / 分类名搜索（多个词用空格分隔），分页方式同 /api/records 的游标分页
+    """
+    user_id = g.user_id
+
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return make_err_response("缺少 q")
+
+    return _records_page(user_id, month=request.args.get("month"), day=request.args.get("day"), keyword=q)
+
+@bp.route('/api/records/import', methods=['POST'])
+@login_required
+def records_import():
+    """
+    CSV 导入：multipart 上传字段 file，或直接以 text/csv 作为请求体
+    ?encoding= 可选，默认 utf-8（兼容 BOM），其它 App 导出的 GBK 文件传 gbk
+    """
+    user_id = g.user_id
+
+    f = request.files.get("file")
+    stream = f.stream if f is not None else request.stream
+    encoding = request.args.get("encoding") or "utf-8-sig"
+
+    try:
+        out = import_records_csv(user_id, stream, encoding=encoding)
+    except Exception as e:
+        return make_err_response(str(e))
+
+    return make_succ_response(out)
+
 
-    data = []
-    for r, category_color in items:
-        data.append({
-            "id": r.id,
-            "type": r.type,
-            "amount_cent": r.amount_cent,
-            "category_id": r.category_id,
-            "category_name_snapshot": r.category_name_snapshot,
-            "category_color": category_color,  # ✅ 新增
-            "note": r.note,
-            "occur_at": r.occur_at.strftime("%Y-%m-%d %H:%M:%S"),
-        })
+def _format_cent(cent: int) -> str:
+    # 不能直接用 // 和 %：负数向下取整，-150 会变成 -2.50
+    sign = "-" if cent < 0 else ""
+    return f"{sign}{abs(cent) // 100}.{abs(cent) % 100:02d}"
 
-    return make_succ_response({"items": data, "total": total, "page": page, "page_size": page_size})
+
+def _export_row(row):
+    cent = int(row.amount_cent or 0)
+    return {
+        "id": row.id,
+        "occur_at": row.occur_at.isoformat(" ", "seconds"),
+        "type": row.type,
+        "amount_cent": cent,
+        "amount": _format_cent(cent),
+        "category_id": row.category_id,
+        "category": row.category_name_snapshot or "",
+        "category_color": row.category_color or "",
+        "note": row.note or "",
+    }
+
+
+_EXPORT_COLUMNS = ["id", "occur_at", "type", "amount_cent", "amount",
+                   "category_id", "category", "category_color", "note"]
+
+
+@bp.route('/api/records/export', methods=['GET'])
+@login_required
+def records_export():
+    """
+    导出账本：?format=csv|ndjson&from=YYYY-MM-DD&to=YYYY-MM-DD（from/to 可选，均为闭区间）
+    边查边写，按块流式输出
+    """
+    user_id = g.user_id
+
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in ("csv", "ndjson"):
+        return make_err_response("format 只能是 csv 或 ndjson")
+
+    try:
+        start = datetime.strptime(request.args["from"], "%Y-%m-%d") if request.args.get("from") else None
+        end = datetime.strptime(request.args["to"], "%Y-%m-%d") + timedelta(days=1) if request.args.get("to") else None
+    except ValueError:
+        return make_err_response("from/to 格式应为 YYYY-MM-DD")
+
+    def generate():
+        if fmt == "csv":
+            buf = io.StringIO()
+            w = csv.DictWriter(buf, fieldnames=_EXPORT_COLUMNS)
+            buf.write("\ufeff")  # BOM：Excel 直接打开不乱码
+            w.writeheader()
+            yield buf.getvalue().encode("utf-8")
+            for rows in iter_export_chunks(user_id, start=start, end=end):
+                buf.seek(0)
+                buf.truncate()
+                w.writerows(_export_row(r) for r in rows)
+                yield buf.getvalue().encode("utf-8")
+        else:
+            for rows in iter_export_chunks(user_id, start=start, end=end):
+                yield b"".join(dumps(_export_row(r)) + b"\n" for r in rows)
+
+    filename = f"records.{fmt}"
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 
-@app.route('/api/records/<int:rid>', methods=['GET'])
+@bp.route('/api/records/<int:rid>', methods=['GET'])
+@login_required
+@versioned_etag
 def record_detail(rid):
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     r = get_record_by_id(user_id, rid)
     if not r:
         return make_err_response("记录不存在")
     
-    receipts = Receipt.query.filter_by(user_id=user_id, record_id=rid).order_by(Receipt.id.asc()).all()
+    receipts = list_receipts(user_id, rid)
 
     return make_succ_response({
         "id": r.id,
@@ -342,24 +510,23 @@ def record_detail(rid):
         "category_id": r.category_id,
         "category_name_snapshot": r.category_name_snapshot,
         "note": r.note or "",
-        "occur_at": r.occur_at.strftime("%Y-%m-%d %H:%M:%S"),
-        "created_at": r.created_at.strftime("%Y-%m-%d %H:%M:%S") if getattr(r, "created_at", None) else None,
-        "updated_at": r.updated_at.strftime("%Y-%m-%d %H:%M:%S") if getattr(r, "updated_at", None) else None,
+        "occur_at": r.occur_at,
+        "created_at": getattr(r, "created_at", None),
+        "updated_at": getattr(r, "updated_at", None),
         
          "receipts": [{
             "id": x.id,
             "file_id": x.file_id,
             "mime_type": x.mime_type,
             "size_bytes": int(x.size_bytes or 0) if x.size_bytes is not None else None,
-            "created_at": x.created_at.strftime("%Y-%m-%d %H:%M:%S") if x.created_at else None,
+            "created_at": x.created_at,
         } for x in receipts]
     })
 
-@app.route('/api/records/<int:rid>', methods=['PUT'])
+@bp.route('/api/records/<int:rid>', methods=['PUT'])
+@login_required
 def record_update(rid):
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     params = request.get_json() or {}
 
@@ -390,11 +557,10 @@ def record_update(rid):
 
 
 
-@app.route('/api/records/<int:rid>', methods=['DELETE'])
+@bp.route('/api/records/<int:rid>', methods=['DELETE'])
+@login_required
 def record_delete(rid):
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     try:
         delete_record(user_id, rid)
@@ -403,11 +569,10 @@ def record_delete(rid):
 
     return make_succ_response({"id": rid})
 
-@app.route('/api/records/<int:rid>/restore', methods=['POST'])
+@bp.route('/api/records/<int:rid>/restore', methods=['POST'])
+@login_required
 def record_restore(rid):
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     try:
         r = restore_record(user_id, rid)
@@ -416,42 +581,19 @@ def record_restore(rid):
 
     return make_succ_response({"id": r.id, "restored": True})
 
-@app.route('/api/records/recycle', methods=['GET'])
+@bp.route('/api/records/recycle', methods=['GET'])
+@login_required
+@versioned_etag
 def records_recycle_list():
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
-
-    page = int(request.args.get("page", "1"))
-    page_size = int(request.args.get("page_size", "20"))
+    user_id = g.user_id
 
-    items, total = list_records(
-        user_id=user_id,
-        page=page,
-        page_size=page_size,
-        only_hidden=True
-    )
+    return _records_page(user_id, only_hidden=True)
 
-    data = []
-    for r, category_color in items:
-        data.append({
-            "id": r.id,
-            "type": r.type,
-            "amount_cent": r.amount_cent,
-            "category_id": r.category_id,
-            "category_name_snapshot": r.category_name_snapshot,
-            "category_color": category_color,  # ✅ 新增
-            "note": r.note,
-            "occur_at": r.occur_at.strftime("%Y-%m-%d %H:%M:%S"),
-        })
-
-    return make_succ_response({"items": data, "total": total, "page": page, "page_size": page_size})
-
-@app.route('/api/stats/calendar', methods=['GET'])
+@bp.route('/api/stats/calendar', methods=['GET'])
+@login_required
+@versioned_etag
 def stats_calendar():
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     month = request.args.get("month")
     if not month:
@@ -459,11 +601,11 @@ def stats_calendar():
 
     return make_succ_response(calendar_summary(user_id, month))
 
-@app.route('/api/stats/month', methods=['GET'])
+@bp.route('/api/stats/month', methods=['GET'])
+@login_required
+@versioned_etag
 def stats_month():
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     month = request.args.get("month")
     if not month:
@@ -471,11 +613,11 @@ def stats_month():
 
     return make_succ_response(month_summary(user_id, month))
 
-@app.route('/api/stats/day', methods=['GET'])
+@bp.route('/api/stats/day', methods=['GET'])
+@login_required
+@versioned_etag
 def stats_day():
-    user_id, err = _current_user_id()
-    if err:
-        return make_err_response(err)
+    user_id = g.user_id
 
     day = request.args.get("day")
     if not day:
@@ -483,7 +625,113 @@ def stats_day():
 
     return make_succ_response(day_summary(user_id, day))
 
-@app.route('/api/wxlogin', methods=['POST'])
+@bp.route('/api/stats/categories', methods=['GET'])
+@login_required
+@versioned_etag
+def stats_categories():
+    """
+    GET /api/stats/categories?month=2024-01&type=expense
+    type 默认 expense
+    """
+    user_id = g.user_id
+
+    month = request.args.get("month")
+    if not month:
+        return make_err_response("缺少 month，格式 YYYY-MM")
+
+    try:
+        return make_succ_response(category_breakdown(user_id, month, request.args.get("type", "expense")))
+    except Exception as e:
+        return make_err_response(str(e))
+
+@bp.route('/api/stats/series', methods=['GET'])
+@login_required
+@versioned_etag
+def stats_series():
+    """
+    GET /api/stats/series?from=2024-01-01&to=2024-12-31&granularity=month
+    from/to 也可以写成 YYYY-MM 或 YYYY；granularity: day/week/month/year，默认 day
+    """
+    user_id = g.user_id
+
+    from_ = request.args.get("from")
+    to = request.args.get("to")
+    if not from_ or not to:
+        return make_err_response("缺少 from / to，格式 YYYY-MM-DD")
+
+    try:
+        return make_succ_response(series_summary(user_id, from_, to, request.args.get("granularity", "day")))
+    except Exception as e:
+        return make_err_response(str(e))
+
+@bp.route('/api/budgets', methods=['GET'])
+@login_required
+@versioned_etag
+def budgets_list():
+    """
+    GET /api/budgets?month=2024-01（不传 month 返回全部）
+    """
+    user_id = g.user_id
+
+    try:
+        return make_succ_response(list_budgets(user_id, request.args.get("month")))
+    except Exception as e:
+        return make_err_response(str(e))
+
+@bp.route('/api/budgets', methods=['POST'])
+@login_required
+def budgets_add():
+    """
+    {"month": "2024-01", "amount_cent": 300000, "alert_enabled": 1}
+    """
+    user_id = g.user_id
+
+    params = request.get_json() or {}
+    for k in ("month", "amount_cent"):
+        if k not in params:
+            return make_err_response(f'缺少 {k}')
+
+    try:
+        b = add_budget(user_id, params["month"], params["amount_cent"], params.get("alert_enabled", 1))
+        return make_succ_response(get_budget(user_id, b.id))
+    except Exception as e:
+        return make_err_response(str(e))
+
+@bp.route('/api/budgets/<int:bid>', methods=['GET'])
+@login_required
+def budget_get_one(bid):
+    user_id = g.user_id
+
+    try:
+        return make_succ_response(get_budget(user_id, bid))
+    except Exception as e:
+        return make_err_response(str(e))
+
+@bp.route('/api/budgets/<int:bid>', methods=['PUT'])
+@login_required
+def budget_update(bid):
+    user_id = g.user_id
+
+    params = request.get_json() or {}
+    try:
+        update_budget(user_id, bid, amount_cent=params.get("amount_cent"), alert_enabled=params.get("alert_enabled"))
+        return make_succ_response(get_budget(user_id, bid))
+    except Exception as e:
+        return make_err_response(str(e))
+
+@bp.route('/api/budgets/<int:bid>', methods=['DELETE'])
+@login_required
+def budget_delete(bid):
+    user_id = g.user_id
+
+    try:
+        delete_budget(user_id, bid)
+    except Exception as e:
+        return make_err_response(str(e))
+
+    return make_succ_response({"ok": True})
+
+@bp.route('/api/wxlogin', methods=['POST'])
 def wxlogin():
     params = request.get_json() or {}
     code = params.get('code')
@@ -494,21 +742,11 @@ def wxlogin():
         return make_err_response('缺少code')
     if not WX_APPID or not WX_SECRET:
         return make_err_response('服务端未配置WX_APPID/WX_SECRET')
-    s = requests.Session()
-    s.trust_env = False # 避免走代理（如果服务器环境配置了 http_proxy 之类的环境变量）
-    # code -> openid
-    resp = requests.get(
-        'https://api.weixin.qq.com/sns/jscode2session',
-        params={
-            'appid': WX_APPID,
-            'secret': WX_SECRET,
-            'js_code': code,
-            'grant_type': 'authorization_code'
-        },
-        verify=False,
-        timeout=8
-    )
-    data = resp.json() if resp is not None else {}
+    # code -> openid（复用连接池，带重试和短时缓存）
+    try:
+        data = get_wx_client().code2session(code)
+    except Exception:
+        return make_err_response("微信登录失败：请求微信接口异常，请稍后重试")
     openid = data.get('openid')
     if not openid:
         return make_err_response(f"微信登录失败：{data.get('errmsg') or '未获取到openid'}")
@@ -531,41 +769,21 @@ def wxlogin():
         "login_type": "wx"
     }, msg='登录成功')
     
-@app.route('/api/logout', methods=['POST'])
+@bp.route('/api/logout', methods=['POST'])
 def logout():
     """
     JWT 是无状态的，前端删除 token 即可视为退出。
     这里做一次 token 校验，仅用于返回统一格式。
     """
-    token = _get_token()
-    if not token:
-        # 没 token 也算成功（已经退出）
-        return make_succ_response({"msg": "已退出登录"})
-
-    try:
-        decode_token(token)
-    except Exception:
-        # token 无效也视为已退出
-        return make_succ_response({"msg": "已退出登录"})
-
+    # 没 token / token 无效也算成功（已经退出）
+    current_user()
     return make_succ_response({"msg": "已退出登录"})
 
-@app.route('/api/whoami', methods=['GET'])
+@bp.route('/api/whoami', methods=['GET'])
+@login_required
 def whoami():
-    token = _get_token()
-    if not token:
-        return make_err_response("未登录：缺少token")
-
-    try:
-        payload = decode_token(token)
-    except Exception:
-        return make_err_response("token无效或已过期")
-
-    user_id = payload.get("user_id")
-    login_type = payload.get("login_type") or "wx"
-
-    if not user_id:
-        return make_err_response("token缺少user_id")
+    user_id = g.user_id
+    login_type = g.token_payload.get("login_type") or "wx"
 
     # 查 users 表
     u = User.query.filter_by(user_id=user_id).first()
@@ -582,7 +800,57 @@ def whoami():
         "status": u.status,
         "phone": u.phone,
         "email": u.email,
-        "created_at": u.created_at.strftime("%Y-%m-%d %H:%M:%S") if u.created_at else None,
-        "updated_at": u.updated_at.strftime("%Y-%m-%d %H:%M:%S") if u.updated_at else None,
+        "created_at": u.created_at,
+        "updated_at": u.updated_at,
     }
     return make_succ_response(data)
+
+
+@bp.route('/api/internal/pool', methods=['GET'])
+@internal_required
+def internal_pool_status():
+    """
+    当前进程的数据库连接池状态：占用/空闲/溢出连接数、取连接等待时间、建连/失效/超时次数
+    """
+    data = pool_status(db.engine)
+    if (current_app.config.get("SQLALCHEMY_BINDS") or {}).get("replica"):
+        data["replica"] = pool_status(db.get_engine(bind="replica"))
+    return make_succ_response(data)
+
+
+@bp.route('/api/internal/purge-recycle', methods=['POST'])
+@internal_required(require_token=True)
+def internal_purge_recycle():
+    """
+    回收站清理（给云托管定时触发器调用）：删除超过保留期的记录及凭证
+    body 可选：retention_days, batch_size, max_seconds（默认 PURGE_MAX_SECONDS）, dry_run
+    单次没删完返回 done=false，下次触发会接着删
+    """
+    params = request.get_json(silent=True) or {}
+    try:
+        data = purge_hidden_records(
+            retention_days=params.get("retention_days"),
+            batch_size=params.get("batch_size"),
+            max_seconds=float(params.get("max_seconds") or current_app.config["PURGE_MAX_SECONDS"]),
+            dry_run=bool(params.get("dry_run")),
+        )
+        return make_succ_response(data)
+    except Exception as e:
+        return make_err_response(str(e))
+
+
+@bp.route('/metrics', methods=['GET'])
+@internal_required
+def metrics_endpoint():
+    """
+    Prometheus 抓取接口（当前进程的统计）：请求耗时、SQL 条数/耗时、慢查询、连接池、各缓存命中
+    """
+    extra = {
+        "db_pool": ("连接池状态（累计值 + 当前占用）", pool_status(db.engine)),
+        "jwt_cache": ("JWT 解码缓存", token_cache_stats()),
+        "category_cache": ("分类列表缓存", category_cache.stats()),
+        "wx_code_cache": ("微信 code 换 openid 缓存", get_wx_client().code_cache.stats()),
+    }
+    if (current_app.config.get("SQLALCHEMY_BINDS") or {}).get("replica"):
+        extra["db_replica_pool"] = ("只读实例连接池状态", pool_status(db.get_engine(bind="replica")))
+    return Response(metrics.render(extra), mimetype="text/plain; version=0.0.4")
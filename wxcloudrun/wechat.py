@@ -0,0 +1,136 @@
+# wxcloudrun/wechat.py
+"""
+微信服务端接口客户端（目前只用到 jscode2session）：
+- 进程内复用一个 requests.Session：连接池 + keep-alive，登录高峰不用每次重新 TLS 握手
+- 连接失败 / 5xx 有限次重试（指数退避）；读超时不重试，避免同一个 code 被用两次
+- code -> openid 结果短时间缓存，并对同一 code 的并发请求合并成一次调用，吸收重复提交
+- session / base_url 可注入，方便对接本地桩服务做测试
+- requests 在第一次建 session 时才导入（只有登录用到，不拖慢冷启动）
+"""
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from wxcloudrun.cache import Cache
+
+if TYPE_CHECKING:
+    import requests
+
+WX_APPID = os.getenv('WX_APPID', 'wxf2ad56f65cb79fee')
+WX_SECRET = os.getenv('WX_SECRET', '8eda8e66f289fe0fc3dbd36919b3fb28')
+WX_API_BASE = os.getenv('WX_API_BASE', 'https://api.weixin.qq.com')
+WX_SSL_VERIFY = os.getenv('WX_SSL_VERIFY', '1') not in ('0', 'false', 'False')
+
+# 微信返回 -1 表示系统繁忙，可稍后重试
+_ERRCODE_BUSY = -1
+
+
+def make_session(retries: int = 2, backoff: float = 0.2, pool_maxsize: int = 16) -> "requests.Session":
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    s = requests.Session()
+    s.trust_env = False  # 避免走代理（如果服务器环境配置了 http_proxy 之类的环境变量）
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize, max_retries=retry)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+class WxClient:
+    def __init__(self, appid: str, secret: str, base_url: str = WX_API_BASE, session=None,
+                 timeout=(3, 5), verify: bool = WX_SSL_VERIFY, busy_retries: int = 1,
+                 code_cache: Cache = None):
+        self.appid = appid
+        self.secret = secret
+        self.base_url = base_url.rstrip("/")
+        self.session = session or make_session()
+        self.timeout = timeout
+        self.verify = verify
+        self.busy_retries = busy_retries
+        self.code_cache = code_cache or Cache("wx_code", ttl=int(os.getenv("WX_CODE_CACHE_TTL", "300")))
+        self._inflight = {}   # code -> threading.Event
+        self._lock = threading.Lock()
+
+    def _call_code2session(self, code: str) -> dict:
+        params = {
+            'appid': self.appid,
+            'secret': self.secret,
+            'js_code': code,
+            'grant_type': 'authorization_code'
+        }
+        for attempt in range(self.busy_retries + 1):
+            resp = self.session.get(f"{self.base_url}/sns/jscode2session", params=params,
+                                    timeout=self.timeout, verify=self.verify)
+            data = resp.json() if resp is not None else {}
+            if data.get("errcode") != _ERRCODE_BUSY or attempt == self.busy_retries:
+                return data
+            time.sleep(0.2 * (attempt + 1))
+        return {}
+
+    def code2session(self, code: str) -> dict:
+        """
+        code -> {"openid", "unionid"?} 或微信的错误 {"errcode", "errmsg"}
+        成功结果按 code 缓存；同一 code 的并发请求只打一次微信接口
+        """
+        cached = self.code_cache.get(code)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            ev = self._inflight.get(code)
+            leader = ev is None
+            if leader:
+                ev = self._inflight[code] = threading.Event()
+
+        if not leader:
+            ev.wait(timeout=sum(self.timeout) * 2)
+            cached = self.code_cache.get(code)
+            if cached is not None:
+                return cached
+            # 首个请求失败了：自己再请求一次（微信会返回具体错误）
+
+        try:
+            data = self._call_code2session(code)
+            if data.get("openid"):
+                # session_key 不缓存，只保留登录需要的字段
+                self.code_cache.set(code, {k: data[k] for k in ("openid", "unionid") if data.get(k)})
+            return data
+        finally:
+            if leader:
+                with self._lock:
+                    self._inflight.pop(code, None)
+                ev.set()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> WxClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = WxClient(WX_APPID, WX_SECRET)
+    return _client
+
+
+def set_client(client: WxClient):
+    """
+    替换全局客户端（测试时注入指向桩服务的客户端）
+    """
+    global _client
+    _client = client